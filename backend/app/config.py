@@ -17,8 +17,83 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 MODE = os.getenv("MODE", "auto")  # auto, offline, online
 
+# Connectivity probe used by MODE=auto: target, per-probe timeout and re-probe interval (seconds)
+CONNECTIVITY_HOST = os.getenv("CONNECTIVITY_HOST", "8.8.8.8")
+CONNECTIVITY_PORT = int(os.getenv("CONNECTIVITY_PORT", "53"))
+CONNECTIVITY_TIMEOUT = float(os.getenv("CONNECTIVITY_TIMEOUT", "2"))
+CONNECTIVITY_TTL = float(os.getenv("CONNECTIVITY_TTL", "30"))
+
 # How many top sections/snippets to show per query
 TOP_SECTIONS_COUNT = int(os.getenv("TOP_SECTIONS_COUNT", "6"))
 
-# TTS provider: 'google' or 'local'
+# Collections searched together by the retrieval routes, with an additive score boost each
+LIBRARY_COLLECTIONS = {"current": DOCUMENTS_DIR, "historical": HISTORICAL_DIR}
+COLLECTION_BOOSTS = {
+    "current": float(os.getenv("CURRENT_BOOST", "0")),
+    "historical": float(os.getenv("HISTORICAL_BOOST", "0")),
+}
+
+# Persona ranking: 'indexed' (reuse ingest-time vectors) or 'pdf' (re-read PDFs via round1b)
+PERSONA_MODE = (os.getenv("PERSONA_MODE") or "indexed").lower()
+# Sections pulled from the index before keyword boosts + balanced selection
+PERSONA_CANDIDATES = int(os.getenv("PERSONA_CANDIDATES", "50"))
+
+# Round1b chunk/heading cache, keyed by PDF content hash + engine version
+ROUND1B_CACHE_DIR = os.path.join(STORAGE_DIR, "cache", "round1b")
+
+# LLM response cache for /insights enrichment and snippet classification:
+# 'memory', 'sqlite' (persisted to LLM_CACHE_PATH) or 'off'
+LLM_CACHE_BACKEND = (os.getenv("LLM_CACHE_BACKEND") or "memory").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH") or os.path.join(STORAGE_DIR, "cache", "llm_responses.sqlite3")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_DISK_SIZE = int(os.getenv("LLM_CACHE_DISK_SIZE", "20000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+# LLM admission control: concurrent calls overall and per route (e.g. "insights=4,doc-chat=6"),
+# how many requests may wait, how long they may wait (seconds) and the Retry-After sent when shed
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_ROUTE_LIMITS = {
+    route.strip(): int(limit)
+    for route, _, limit in (item.partition("=") for item in os.getenv("LLM_ROUTE_LIMITS", "").split(","))
+    if route.strip() and limit.strip()
+}
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2"))
+LLM_RETRY_AFTER = int(os.getenv("LLM_RETRY_AFTER", "2"))
+
+# Background ingest: worker threads, and how many finished jobs /ingest/jobs remembers
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+# Processes parsing PDFs concurrently within a multi-file upload (1 → parse inline)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Sections per SentenceTransformer forward pass during ingest
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Query embeddings kept in the LRU shared by all retrieval routes
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+# Approximate nearest-neighbour search (IVF-flat): 'ivf' or 'exact' (brute force only)
+ANN_BACKEND = (os.getenv("ANN_BACKEND") or "ivf").lower()
+# Train the IVF index once a directory holds this many sections
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "20000"))
+# Number of inverted lists (0 → sqrt(rows))
+ANN_LISTS = int(os.getenv("ANN_LISTS", "0"))
+# Lists scanned per query: higher = better recall, slower
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Retrain when a directory grows this many times past its training size
+ANN_RETRAIN_FACTOR = float(os.getenv("ANN_RETRAIN_FACTOR", "4"))
+
+# TTS provider: 'google' (alias of 'gcp'), 'azure', 'local' (pyttsx3) or 'stub' (offline silent audio)
 TTS_PROVIDER = (os.getenv("TTS_PROVIDER") or "google").lower()
+
+# Preload the embedding model and directory indexes in the background at startup;
+# /ready returns 503 until this has finished (or the model has loaded lazily)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+# A failed warm-up is retried this many times, WARMUP_BACKOFF seconds apart (doubling)
+WARMUP_RETRIES = int(os.getenv("WARMUP_RETRIES", "3"))
+WARMUP_BACKOFF = float(os.getenv("WARMUP_BACKOFF", "5"))
+
+# Print how long the lazily loaded heavy dependencies take on first use
+# (embedding model, NLTK data, Gemini SDK) (PROFILE_IMPORTS=1)
+PROFILE_IMPORTS = os.getenv("PROFILE_IMPORTS", "0") == "1"
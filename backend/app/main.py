@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from app.routes import ingest, recommend, documents, insights, podcast, recommend_selection, document_chat
 from app import config
+from app.services import connectivity_service, warmup_service
 import os
 
 app = FastAPI(title="PersonaExtractor Hybrid Backend", version="1.0")
@@ -35,6 +37,17 @@ app.include_router(document_chat.router, prefix="", tags=["AI Chat"])
 app.include_router(podcast.router, prefix="", tags=["Podcast"])
 app.include_router(recommend_selection.router, prefix="", tags=["Recommend Selection"])
 
+@app.on_event("startup")
+def start_background_tasks():
+    warmup_service.start()
+    connectivity_service.start()
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the startup warm-up has finished (or the model has loaded lazily). Also reports cached connectivity."""
+    state = {**warmup_service.status(), "connectivity": connectivity_service.status()}
+    return JSONResponse(state, status_code=200 if warmup_service.is_ready() else 503)
+
 @app.get("/")
 def root():
     return {
@@ -1,9 +1,13 @@
 # backend/app/routes/doc_chat.py
-from fastapi import APIRouter
+import json
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from app import config
-from app.services.llm_service import LLMService, LLMError
-from app.services.embed_service import embed_text, embed_search_in_dir
+from app.services import llm_executor
+from app.services.llm_service import get_llm_service, llm_breaker, LLMError, LLMUnavailable, SOURCE_BREAKER_OPEN
+from app.services.embed_service import embed_query, search_collections
 import numpy as np
 
 router = APIRouter()
@@ -12,42 +16,28 @@ class DocChatReq(BaseModel):
     message: str
     top_k: int = 5
 
-@router.post("/doc-chat")
-async def doc_chat(req: DocChatReq):
-    message = req.message.strip()
-    top_k = req.top_k
 
-    if not message:
-        return {"response": "Empty query", "mode": "error"}
+def _retrieve(message: str, top_k: int):
+    """Load relevant sections from documents + historical."""
+    query_vec = embed_query(message)
+    return search_collections(
+        query_vec, config.LIBRARY_COLLECTIONS, top_k=top_k, boosts=config.COLLECTION_BOOSTS
+    )
 
-    # --- Load relevant sections from documents + historical ---
-    try:
-        docs_sections = []
-        for dir_path in [config.DOCUMENTS_DIR, config.HISTORICAL_DIR]:
-            query_vec = embed_text(message)
-            if query_vec.size == 0:
-                continue
-            top_sections = embed_search_in_dir(query_vec, dir_path, top_k=top_k)
-            docs_sections.extend(top_sections)
-    except Exception as e:
-        return {"response": "Failed to search documents", "error": str(e), "mode": "error"}
-
-    if not docs_sections:
-        # fallback: no document context
-        return {"response": "Out of context", "mode": "online"}
 
-    # --- Prepare context for LLM ---
+def _context_snippets(docs_sections, top_k: int):
     # Soft threshold: include top-k matches regardless of score
     context_snippets = []
     for s in docs_sections[:top_k]:
         text = s.get("text") or s.get("excerpt") or ""
         score = s.get("score", 0)
         context_snippets.append(f"- {text.strip()} (score: {score:.2f})")
+    return context_snippets
 
-    context_str = "\n".join(context_snippets)
 
-    # --- Structured prompt for Gemini ---
-    prompt = f"""
+def _build_prompt(context_str: str, message: str) -> str:
+    """Structured prompt for Gemini."""
+    return f"""
 You are a document-grounded AI assistant. Only answer based on the provided context.
 Do NOT hallucinate or provide information outside of it.  
 
@@ -63,10 +53,55 @@ Instructions:
 - Include a short reference to which excerpts were used.
 """
 
+
+_BREAKER_OPEN_REPLY = {"response": "Failed to get LLM response",
+                       "error": "LLM temporarily unavailable (circuit open)", "mode": SOURCE_BREAKER_OPEN}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _busy(e: llm_executor.LLMBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@router.post("/doc-chat")
+async def doc_chat(req: DocChatReq):
+    message = req.message.strip()
+    top_k = req.top_k
+
+    if not message:
+        return {"response": "Empty query", "mode": "error"}
+
+    try:
+        docs_sections = _retrieve(message, top_k)
+    except Exception as e:
+        return {"response": "Failed to search documents", "error": str(e), "mode": "error"}
+
+    if not docs_sections:
+        # fallback: no document context
+        return {"response": "Out of context", "mode": "online"}
+
+    context_snippets = _context_snippets(docs_sections, top_k)
+    prompt = _build_prompt("\n".join(context_snippets), message)
+
     # --- Generate answer via Gemini ---
+    if not llm_breaker.allow():
+        return {**_BREAKER_OPEN_REPLY, "context_used": context_snippets}
     try:
-        llm = LLMService()
-        answer = llm.generate(prompt, max_tokens=400, temperature=0.2)
+        llm = get_llm_service()
+        async with llm_executor.slot("doc-chat"):
+            answer = await llm.agenerate(prompt, max_tokens=400, temperature=0.2)
+    except llm_executor.LLMBusy as e:
+        raise _busy(e)
+    except LLMUnavailable:
+        # the breaker opened while this request waited for a slot
+        return {**_BREAKER_OPEN_REPLY, "context_used": context_snippets}
     except LLMError as e:
         return {"response": "Failed to get LLM response", "error": str(e), "mode": "online_error"}
     except Exception as e:
@@ -79,3 +114,74 @@ Instructions:
         "mode": "online",
         "query": message
     }
+
+
+async def _chat_events(message: str, top_k: int, llm_allowed: bool = True):
+    if not message:
+        yield _sse("error", {"response": "Empty query", "mode": "error"})
+        return
+    try:
+        docs_sections = _retrieve(message, top_k)
+    except Exception as e:
+        yield _sse("error", {"response": "Failed to search documents", "error": str(e), "mode": "error"})
+        return
+    if not docs_sections:
+        yield _sse("done", {"response": "Out of context", "mode": "online"})
+        return
+
+    context_snippets = _context_snippets(docs_sections, top_k)
+    yield _sse("context", {"context_used": context_snippets, "query": message})
+
+    if not llm_allowed:
+        yield _sse("done", _BREAKER_OPEN_REPLY)
+        return
+    prompt = _build_prompt("\n".join(context_snippets), message)
+    try:
+        llm = get_llm_service()
+        async for piece in llm.astream(prompt, max_tokens=400, temperature=0.2):
+            yield _sse("token", {"text": piece})
+    except LLMUnavailable:
+        # the breaker opened after admission; nothing has been streamed yet
+        yield _sse("done", _BREAKER_OPEN_REPLY)
+        return
+    except Exception as e:
+        yield _sse("error", {"response": "Failed to get LLM response", "error": str(e), "mode": "online_error"})
+        return
+    yield _sse("done", {"mode": "online"})
+
+
+@router.post("/doc-chat/stream")
+async def doc_chat_stream(req: DocChatReq):
+    """
+    Server-sent-events variant of /doc-chat. Emits, in order:
+      event: context  {"context_used": [...], "query": ...}   as soon as retrieval is done
+      event: token    {"text": ...}                           for each piece of the answer
+      event: done     {"mode": ...}                           (with "response" when there is no LLM answer)
+    or a single `event: error` with the same fields /doc-chat returns on failure.
+    While the breaker is open the context is still sent, followed by `done` with
+    mode=offline_breaker_open.
+    """
+    admitted = None
+    if llm_breaker.allow():
+        # Admit before the 200 goes out so a saturated server can still answer 429
+        try:
+            admitted = await llm_executor.acquire("doc-chat")
+        except llm_executor.LLMBusy as e:
+            raise _busy(e)
+
+    async def events():
+        try:
+            async for event in _chat_events(req.message.strip(), req.top_k, llm_allowed=admitted is not None):
+                yield event
+        finally:
+            if admitted is not None:
+                admitted.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # releases the slot even if the client disconnects before the stream starts
+        background=BackgroundTask(admitted.release) if admitted is not None else None,
+    )
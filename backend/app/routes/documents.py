@@ -1,6 +1,7 @@
 # backend/app/routes/documents.py
 from fastapi import APIRouter, HTTPException, status
 from app import config
+from app.services import index_store
 import os
 import urllib.parse
 
@@ -62,9 +63,9 @@ def delete_document(filename: str):
     files_to_delete = [
         os.path.join(storage_dir, decoded_filename),  # PDF
         os.path.join(storage_dir, f"{base_filename}_structure.json"),
-        os.path.join(storage_dir, f"{base_filename}_embeddings.json"),
+        *index_store.sidecar_paths(storage_dir, base_filename),
         os.path.join(config.OUTPUT_DIR, f"{base_filename}_structure.json"),
-        os.path.join(config.OUTPUT_DIR, f"{base_filename}_embeddings.json"),
+        *index_store.sidecar_paths(config.OUTPUT_DIR, base_filename),
     ]
 
     deleted_count = 0
@@ -1,105 +1,32 @@
 # backend/app/routes/ingest.py
-from fastapi import APIRouter, File, UploadFile, Form
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from app import config
 import os
 import shutil
-import json
 from datetime import datetime
-from typing import List, Dict, Any
-from app.services.pdf_parser_service import parse_pdf
-from app.services.embed_service import embed_text
-from engines.round1a.processor import extract_document_structure
+from typing import List
+from app.services import ingest_service
 
 router = APIRouter()
 
 
-def normalize_sections(parsed_structure: Dict[str, Any], pdf_path: str) -> List[Dict[str, Any]]:
-    """
-    Normalize sections from parsed structure.
-    Fallback: outline or full text if there are no sections.
-    """
-    sections = []
-
-    if parsed_structure.get("sections"):
-        for sec in parsed_structure["sections"]:
-            text = sec.get("text", "").strip()
-            if text:
-                sections.append({
-                    "text": text,
-                    "page_number": sec.get("page_number"),
-                    "excerpt": sec.get("excerpt", text[:200]),
-                    "document": parsed_structure.get("title") or os.path.basename(pdf_path)
-                })
-
-    if not sections:
-        combined_text = parsed_structure.get("text", "")
-        if not combined_text and parsed_structure.get("outline"):
-            combined_text = " ".join([h.get("text", "") for h in parsed_structure["outline"]])
-        if combined_text.strip():
-            sections.append({
-                "text": combined_text.strip(),
-                "page_number": 1,
-                "excerpt": combined_text.strip()[:200],
-                "document": parsed_structure.get("title") or os.path.basename(pdf_path)
-            })
-
-    return sections
-
-
-def save_embedding_index(section_list: List[Dict[str, Any]], save_path: str, document_info: Dict[str, Any]):
-    """
-    Save embeddings for each section into a JSON file.
-    Always include:
-      - doc_id: filename (canonical ID)
-      - doc_name: pretty title (for display in UI)
-      - source_file: same as doc_id
-    """
-    index_data = []
-    doc_name = document_info.get("title", os.path.splitext(os.path.basename(save_path))[0].replace("_embeddings", ""))
-    file_mtime = document_info.get("file_mtime", datetime.utcnow().timestamp())
-    source_file = document_info.get("filename", os.path.basename(save_path))  # always filename.pdf
-
-    for section in section_list:
-        text = section.get("text", "").strip()
-        if not text:
-            continue
+def _save_upload(file: UploadFile, pdf_path: str):
+    file.file.seek(0)
+    with open(pdf_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
 
-        try:
-            vec = embed_text(text)
-            if vec is None or (hasattr(vec, "size") and vec.size == 0):
-                print(f"[WARN] Empty vector for section: {text[:50]}... Skipping.")
-                continue
-        except Exception as e:
-            print(f"[ERROR] embed_text failed: {e}")
-            continue
 
-        index_data.append({
-            "text": text,
-            "vector": vec.tolist(),
-            "doc_id": source_file,                     # ✅ filename as canonical ID
-            "doc_name": doc_name,                      # ✅ pretty title
-            "document": section.get("document", doc_name),  
-            "page_number": section.get("page_number"),
-            "excerpt": section.get("excerpt", text[:200]),
-            "file_mtime": file_mtime,
-            "source_file": source_file                 # ✅ same as doc_id
-        })
-
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(index_data, f, ensure_ascii=False, indent=2)
-
-    print(f"[INFO] Saved {len(index_data)} embeddings → {save_path}")
-
-
-
-@router.post("/ingest")
+@router.post("/ingest", status_code=status.HTTP_202_ACCEPTED)
 async def ingest(
     files: List[UploadFile] = File(...),
     kind: str = Form("current")  # "current" → one file, "historical" → multiple files
 ):
     """
-    Ingest uploaded PDFs: parse, normalize, extract structure, embed sections,
-    and save both structure + embeddings JSON. Ensures source_file == filename.
+    Save uploaded PDFs and queue them for ingest (parse, normalize, extract
+    structure, embed sections, save structure JSON + binary embeddings index).
+    Returns immediately with a job id; poll GET /ingest/jobs/{id} for per-file
+    progress and results. Ensures source_file == filename.
     """
     is_historical = kind.lower() == "historical"
     target_dir = config.HISTORICAL_DIR if is_historical else config.DOCUMENTS_DIR
@@ -108,70 +35,30 @@ async def ingest(
     os.makedirs(config.OUTPUT_DIR, exist_ok=True)
 
     upload_files = files if is_historical else files[:1]
-    responses = []
+    saved_files = []
 
     for file in upload_files:
         filename = os.path.basename(file.filename) or f"upload_{datetime.utcnow().timestamp()}.pdf"
         pdf_path = os.path.join(target_dir, filename)
 
-        # Save uploaded file
-        file.file.seek(0)
-        with open(pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save uploaded file off the event loop so large batches don't stall other requests
+        await run_in_threadpool(_save_upload, file, pdf_path)
+        saved_files.append((filename, pdf_path))
 
-        try:
-            # Parse + extract structure
-            parsed_structure = parse_pdf(pdf_path)
-            outline_data = extract_document_structure(pdf_path)
+    return ingest_service.submit_job(kind.lower(), target_dir, saved_files)
 
-            parsed_structure["outline"] = outline_data.get("outline", [])
-            parsed_structure["title"] = outline_data.get("title", os.path.splitext(filename)[0])
-            parsed_structure["file_mtime"] = os.path.getmtime(pdf_path)
-            parsed_structure["sections"] = normalize_sections(parsed_structure, pdf_path)
-            parsed_structure["uploaded_at"] = datetime.utcnow().isoformat()
-            parsed_structure["source_pdf"] = pdf_path
 
-        except Exception as e:
-            responses.append({
-                "status": "error",
-                "filename": filename,
-                "message": f"Failed to parse PDF: {e}"
-            })
-            continue
+@router.get("/ingest/jobs")
+def list_ingest_jobs():
+    return {"jobs": ingest_service.list_jobs()}
 
-        # Save structure JSON
-        structure_filename = f"{os.path.splitext(filename)[0]}_structure.json"
-        structure_path = os.path.join(target_dir, structure_filename)
-        with open(structure_path, "w", encoding="utf-8") as f:
-            json.dump(parsed_structure, f, ensure_ascii=False, indent=2)
 
-        output_structure_path = os.path.join(config.OUTPUT_DIR, structure_filename)
-        shutil.copyfile(structure_path, output_structure_path)
-
-        # Save embeddings JSON
-        embeddings_filename = f"{os.path.splitext(filename)[0]}_embeddings.json"
-        embeddings_path = os.path.join(target_dir, embeddings_filename)
-        save_embedding_index(
-            parsed_structure.get("sections", []),
-            embeddings_path,
-            document_info={
-                "title": parsed_structure.get("title"),
-                "file_mtime": parsed_structure.get("file_mtime"),
-                "filename": filename  # ✅ CRITICAL FIX
-            }
+@router.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    job = ingest_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingest job not found: {job_id}"
         )
-
-        output_embeddings_path = os.path.join(config.OUTPUT_DIR, embeddings_filename)
-        shutil.copyfile(embeddings_path, output_embeddings_path)
-
-        responses.append({
-            "status": "ok",
-            "filename": filename,
-            "storage_dir": target_dir,
-            "structure_path": structure_path,
-            "output_structure_path": output_structure_path,
-            "embeddings_path": embeddings_path,
-            "output_embeddings_path": output_embeddings_path
-        })
-
-    return responses
+    return job
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
-from app.services.llm_service import LLMService, LLMError
-from app.utils import internet_available
+from app.services import llm_cache, llm_executor
+from app.services.embed_service import query_cache_stats
+from app.services.llm_service import get_llm_service, json_repair_stats, llm_breaker, LLMError, LLMUnavailable
+from app.services import connectivity_service
 from app import config
 import json
 
@@ -14,7 +16,7 @@ class InsightsRequest(BaseModel):
 
 @router.post("/insights")
 async def insights(payload: InsightsRequest):
-    if not (config.MODE in ("online", "auto") and internet_available()):
+    if not (config.MODE in ("online", "auto") and connectivity_service.is_online()):
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
             detail="Cannot generate insights: Online mode is disabled."
@@ -24,11 +26,19 @@ async def insights(payload: InsightsRequest):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot generate insights: 'texts' field cannot be empty."
         )
+    if not llm_breaker.allow():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot generate insights: LLM temporarily unavailable (circuit open).",
+            headers={"Retry-After": str(llm_breaker.retry_after())}
+        )
 
     try:
-        svc = LLMService()
+        svc = get_llm_service()
         # The enrich_with_context function will now handle parsing and return a dictionary
-        parsed_json = svc.enrich_with_context(
+        parsed_json = await llm_executor.run(
+            "insights",
+            svc.enrich_with_context,
             payload.texts,
             payload.persona,
             payload.task
@@ -36,6 +46,18 @@ async def insights(payload: InsightsRequest):
         
         return { "source": "online", "parsed": parsed_json }
         
+    except llm_executor.LLMBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except LLMUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(llm_breaker.retry_after())}
+        )
     except LLMError as e:
         # This catches errors from the LLM service, including parsing failures
         print(f"[ERROR] LLMError in /insights: {e}")
@@ -50,3 +72,16 @@ async def insights(payload: InsightsRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred: {str(e)}"
         )
+
+
+@router.get("/insights/metrics")
+def insights_metrics():
+    """JSON repair rate of enrichment output, plus cache, admission and circuit-breaker state."""
+    cache = llm_cache.get_cache()
+    return {
+        "json": json_repair_stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "query_embedding_cache": query_cache_stats(),
+        "executor": llm_executor.stats(),
+        "breaker": llm_breaker.status(),
+    }
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from app import config
-from app.services.tts_service import generate_audio # <-- Import the new, single unified function
+from fastapi.concurrency import run_in_threadpool
+from app.services.tts_service import generate_audio, podcast_cache_stats # <-- Import the new, single unified function
 
 router = APIRouter()
 
@@ -34,7 +35,8 @@ async def podcast(req: PodcastRequest):
     print(f"[INFO] Generating podcast with script: '{script[:100]}...'")
     
     # We pass the script and the directory where the audio file should be saved.
-    tts_result = generate_audio(script, config.OUTPUT_DIR)
+    # Repeats of the same script/provider/voice come straight from the audio cache.
+    tts_result = await run_in_threadpool(generate_audio, script, config.OUTPUT_DIR)
     
     # Check if the TTS service returned an error.
     if "error" in tts_result:
@@ -45,4 +47,10 @@ async def podcast(req: PodcastRequest):
         )
         
     # If successful, return the script and the TTS result (which contains the URL).
-    return {"script": script, "tts": tts_result}
\ No newline at end of file
+    return {"script": script, "tts": tts_result}
+
+
+@router.get("/podcast/cache")
+def podcast_cache():
+    """Podcast audio cache: hit/miss/eviction counters and current size of OUTPUT_DIR's podcast files."""
+    return podcast_cache_stats(config.OUTPUT_DIR)
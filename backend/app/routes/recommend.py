@@ -2,10 +2,11 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from app import config
-from app.services.selection_extractor_service import find_relevant_sections
-from app.services.multi_doc_service import merge_and_rank
-from app.utils import internet_available, excerpt
-from app.services.llm_service import LLMService
+from app.services.selection_extractor_service import search_library
+from app.services.multi_doc_service import rank_hits
+from app.utils import excerpt
+from app.services import connectivity_service, llm_executor
+from app.services.llm_service import get_llm_service, llm_breaker, LLMUnavailable, SOURCE_BREAKER_OPEN
 
 router = APIRouter()
 
@@ -18,10 +19,10 @@ class RecommendRequest(BaseModel):
 @router.post("/recommend")
 async def recommend(payload: RecommendRequest):
     # --- Step 1: Offline embedding search ---
-    same_doc_res = find_relevant_sections(payload.selected_text, config.DOCUMENTS_DIR)
-    other_doc_res = find_relevant_sections(payload.selected_text, config.HISTORICAL_DIR)
+    # One ranked pass over current + historical; 2x candidates leave headroom for dedup
+    hits = search_library(payload.selected_text, top_k=2 * payload.top_k)
 
-    merged = merge_and_rank(same_doc_res, other_doc_res, payload.top_k)
+    merged = rank_hits(hits, payload.top_k)
     recommendations = merged.get("recommendations", [])
 
     # Ensure snippet + doc_id
@@ -39,16 +40,27 @@ async def recommend(payload: RecommendRequest):
             rec["doc_id"] = rec.get("document")  # pretty title as last resort
 
     # --- Step 2: Optional Online LLM Classification ---
-    if payload.online and config.MODE in ("online", "auto") and internet_available():
+    if not (payload.online and config.MODE in ("online", "auto") and connectivity_service.is_online()):
+        source = "offline"
+    elif not llm_breaker.allow():
+        # Gemini is failing or too slow: skip it without waiting
+        source = SOURCE_BREAKER_OPEN
+    else:
         try:
-            llm = LLMService()
-            recommendations = llm.classify_snippet_relations(payload.selected_text, recommendations)
+            llm = get_llm_service()
+            recommendations = await llm_executor.run(
+                "recommend", llm.classify_snippet_relations, payload.selected_text, recommendations
+            )
             source = "hybrid"
+        except llm_executor.LLMBusy as e:
+            # classification is optional: shed it and still serve the offline results
+            print(f"[WARN] {e}")
+            source = llm_executor.SOURCE_LLM_BUSY
+        except LLMUnavailable:
+            source = SOURCE_BREAKER_OPEN
         except Exception as e:
             print(f"[WARN] LLM classification failed during /recommend: {e}")
             source = "offline_classification_failed"
-    else:
-        source = "offline"
 
     # --- Step 3: Ensure every snippet has a relation_type for the frontend ---
     for rec in recommendations:
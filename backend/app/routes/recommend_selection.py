@@ -1,10 +1,10 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from app import config
-from app.services.selection_extractor_service import find_relevant_sections
-from app.services.multi_doc_service import merge_and_rank
-from app.utils import internet_available
-from app.services.llm_service import LLMService
+from app.services.selection_extractor_service import search_library
+from app.services.multi_doc_service import rank_hits
+from app.services import connectivity_service, llm_executor
+from app.services.llm_service import get_llm_service, llm_breaker, LLMUnavailable, SOURCE_BREAKER_OPEN
 
 router = APIRouter()
 
@@ -15,24 +15,37 @@ class SelectionRequest(BaseModel):
 @router.post("/recommend-selection")
 async def recommend_selection(payload: SelectionRequest):
     # --- Offline search ---
-    same_doc_res = find_relevant_sections(payload.selected_text, config.DOCUMENTS_DIR)
-    other_doc_res = find_relevant_sections(payload.selected_text, config.HISTORICAL_DIR)
+    # One ranked pass over current + historical; 2x candidates leave headroom for dedup
+    hits = search_library(payload.selected_text, top_k=2 * payload.top_k)
 
-    merged = merge_and_rank(same_doc_res, other_doc_res, payload.top_k)
+    merged = rank_hits(hits, payload.top_k)
     response = {"source": "offline", "offline": merged}
 
     # --- Online enrichment ---
-    if config.MODE in ("online", "auto") and internet_available():
+    if config.MODE in ("online", "auto") and connectivity_service.is_online():
+        if not llm_breaker.allow():
+            # Gemini is failing or too slow: serve offline results without waiting
+            response["source"] = SOURCE_BREAKER_OPEN
+            return response
         try:
-            svc = LLMService()
-            offline_snips = [r["text"] for r in merged]  # merged = list of matches
-            enriched = svc.enrich_with_context(
+            svc = get_llm_service()
+            offline_snips = [r["text"] for r in merged.get("recommendations", [])]
+            enriched = await llm_executor.run(
+                "recommend-selection",
+                svc.enrich_with_context,
                 offline_snips,
                 "AutoPersona",
                 f"Analyze selection: {payload.selected_text}"
             )
             response["source"] = "hybrid"
             response["online"] = enriched
+        except llm_executor.LLMBusy as e:
+            # enrichment is optional: shed it and still serve the offline results
+            response["source"] = llm_executor.SOURCE_LLM_BUSY
+            response["online_error"] = str(e)
+        except LLMUnavailable as e:
+            response["source"] = SOURCE_BREAKER_OPEN
+            response["online_error"] = str(e)
         except Exception as e:
             response["online_error"] = str(e)
 
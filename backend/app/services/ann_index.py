@@ -0,0 +1,193 @@
+# backend/app/services/ann_index.py
+"""
+IVF-flat approximate nearest-neighbour index in pure NumPy.
+
+Per directory we persist:
+  - _ivf_centroids.npz              spherical k-means centroids + an index id
+  - <base>_embeddings.ivf.npz       inverted-list id of every row of that document
+
+Centroids are trained at ingest time once a directory holds ANN_MIN_ROWS
+sections, and retrained when it grows ANN_RETRAIN_FACTOR× past the training
+size. Every later /ingest only assigns the new document's rows to their
+nearest list (incremental insertion). At query time only the ANN_NPROBE lists
+closest to the query are scored; ANN_NPROBE is the recall/latency knob and
+ANN_BACKEND=exact falls back to brute force everywhere.
+"""
+import os
+import uuid
+import numpy as np
+from typing import Optional, Tuple
+from app import config
+from app.services import index_store
+
+CENTROIDS_FILE = "_ivf_centroids.npz"
+TRAIN_ITERS = 10
+TRAIN_SAMPLE = 50000
+_ASSIGN_CHUNK = 8192
+
+
+class IVFIndex:
+    """Centroids of one directory. `index_id` changes on every retrain."""
+
+    def __init__(self, centroids: np.ndarray, index_id: str, trained_rows: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.index_id = index_id
+        self.trained_rows = trained_rows
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest list of each (unit-length) row."""
+        out = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], _ASSIGN_CHUNK):
+            block = np.asarray(vectors[start:start + _ASSIGN_CHUNK], dtype=np.float32)
+            out[start:start + block.shape[0]] = np.argmax(block @ self.centroids.T, axis=1)
+        return out
+
+    def candidates(self, query: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row ids in the `nprobe` lists closest to `query` (see build_lists)."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        list_scores = self.centroids @ query
+        probe = np.argpartition(-list_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[l]:offsets[l + 1]] for l in probe])
+
+
+def enabled() -> bool:
+    return config.ANN_BACKEND == "ivf"
+
+
+def build_lists(assign: np.ndarray, n_lists: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Group row ids by list: rows of list l are order[offsets[l]:offsets[l + 1]]."""
+    order = np.argsort(assign, kind="stable")
+    offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+    return order, offsets
+
+
+def centroids_path(dir_path: str) -> str:
+    return os.path.join(dir_path, CENTROIDS_FILE)
+
+
+def assignments_path(vectors_path: str) -> str:
+    return vectors_path[: -len(index_store.VECTORS_SUFFIX)] + index_store.ASSIGN_SUFFIX
+
+
+def load_index(dir_path: str) -> Optional[IVFIndex]:
+    path = centroids_path(dir_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return IVFIndex(data["centroids"], str(data["index_id"]), int(data["trained_rows"]))
+    except Exception as e:
+        print(f"[WARN] Failed to load ANN index {path}: {e}")
+        return None
+
+
+def load_assignments(vectors_path: str, index: IVFIndex, n_rows: int) -> Optional[np.ndarray]:
+    """Persisted list ids for a document, or None if missing or from another training run."""
+    path = assignments_path(vectors_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if str(data["index_id"]) != index.index_id or data["lists"].shape[0] != n_rows:
+                return None
+            return data["lists"].astype(np.int32, copy=False)
+    except Exception as e:
+        print(f"[WARN] Failed to load ANN assignments {path}: {e}")
+        return None
+
+
+def _save_assignments(vectors_path: str, index: IVFIndex, lists: np.ndarray):
+    index_store.atomic_write(
+        assignments_path(vectors_path),
+        lambda f: np.savez(f, lists=lists.astype(np.int32), index_id=np.array(index.index_id)),
+    )
+
+
+def _train(vectors: np.ndarray, n_lists: int) -> np.ndarray:
+    """Spherical k-means on unit-length rows."""
+    rng = np.random.default_rng(0)
+    if vectors.shape[0] > TRAIN_SAMPLE:
+        vectors = vectors[rng.choice(vectors.shape[0], TRAIN_SAMPLE, replace=False)]
+    centroids = vectors[rng.choice(vectors.shape[0], n_lists, replace=False)].copy()
+    for _ in range(TRAIN_ITERS):
+        assign = IVFIndex(centroids, "", 0).assign(vectors)
+        order, offsets = build_lists(assign, n_lists)
+        counts = np.diff(offsets)
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(vectors[order], offsets[:-1][~empty], axis=0)
+        if empty.any():
+            # re-seed empty lists from random rows
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+def _default_lists(n_rows: int) -> int:
+    return config.ANN_LISTS or max(1, int(np.sqrt(n_rows)))
+
+
+def rebuild(dir_path: str) -> Optional[IVFIndex]:
+    """Train fresh centroids on every row in `dir_path` and re-assign all documents."""
+    paths = index_store.list_indexes(dir_path)
+    blocks = []
+    for p in paths:
+        vectors, _, sections = index_store.read_index(p)
+        if sections and (not blocks or vectors.shape[1] == blocks[0].shape[1]):
+            blocks.append(vectors)
+    if not blocks:
+        return None
+    matrix = np.concatenate(blocks)
+    n_lists = min(_default_lists(matrix.shape[0]), matrix.shape[0])
+    index = IVFIndex(_train(matrix, n_lists), uuid.uuid4().hex, matrix.shape[0])
+
+    for p in paths:
+        vectors, _, sections = index_store.read_index(p)
+        if sections and vectors.shape[1] == index.centroids.shape[1]:
+            _save_assignments(p, index, index.assign(vectors))
+
+    index_store.atomic_write(
+        centroids_path(dir_path),
+        lambda f: np.savez(f, centroids=index.centroids, index_id=np.array(index.index_id),
+                           trained_rows=np.array(index.trained_rows)),
+    )
+    print(f"[INFO] Trained IVF index for {dir_path}: {n_lists} lists over {matrix.shape[0]} rows")
+    return index
+
+
+def _count_rows(dir_path: str) -> int:
+    total = 0
+    for p in index_store.list_indexes(dir_path):
+        try:
+            total += np.load(p, mmap_mode="r").shape[0]
+        except Exception:
+            continue
+    return total
+
+
+def add_document(dir_path: str, vectors_path: str):
+    """
+    Ingest hook: insert one document's rows into the directory's IVF index,
+    training (or retraining) the centroids first when the directory has grown enough.
+    """
+    if not enabled():
+        return
+    index = load_index(dir_path)
+    n_rows = _count_rows(dir_path)
+    if index is None:
+        if n_rows >= config.ANN_MIN_ROWS:
+            rebuild(dir_path)
+        return
+    if n_rows >= index.trained_rows * config.ANN_RETRAIN_FACTOR:
+        rebuild(dir_path)
+        return
+
+    vectors, _, sections = index_store.read_index(vectors_path)
+    if sections and vectors.shape[1] == index.centroids.shape[1]:
+        _save_assignments(vectors_path, index, index.assign(vectors))
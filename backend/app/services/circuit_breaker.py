@@ -0,0 +1,110 @@
+# backend/app/services/circuit_breaker.py
+"""
+Circuit breaker for an unreliable dependency (the LLM provider).
+
+closed     calls go through; `failure_threshold` consecutive failures, or
+           `slow_threshold` consecutive successes slower than `latency_slo`
+           seconds, trip the breaker
+open       allow() is False, so callers take their offline path at once;
+           after `cooldown` seconds a background probe runs
+half_open  the probe is running; still no regular traffic. A probe that
+           succeeds within `latency_slo` closes the breaker; a failed or slow
+           one re-opens it for another cooldown
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, latency_slo: float, slow_threshold: int,
+                 cooldown: float, probe: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_slo = latency_slo
+        self.slow_threshold = slow_threshold
+        self.cooldown = cooldown
+        self.probe = probe
+        self.state = CLOSED
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._last_reason = None
+        self._stats = {"trips": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a regular call may go out now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def retry_after(self) -> int:
+        with self._lock:
+            if self.state == CLOSED:
+                return 0
+            return max(1, int(round(self._opened_at + self.cooldown - time.time())))
+
+    def record_success(self, latency: float):
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self._failures = 0
+            if latency <= self.latency_slo:
+                self._slow = 0
+                return
+            self._slow += 1
+            if self._slow >= self.slow_threshold:
+                self._trip(f"{self._slow} calls slower than {self.latency_slo}s")
+
+    def record_failure(self, reason: str = ""):
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._trip(f"{self._failures} consecutive failures: {reason}")
+
+    def _trip(self, reason: str):
+        # caller holds the lock
+        self.state = OPEN
+        self._opened_at = time.time()
+        self._last_reason = reason
+        self._stats["trips"] += 1
+        print(f"[WARN] Circuit '{self.name}' opened ({reason}); probing again in {self.cooldown:.0f}s")
+        timer = threading.Timer(self.cooldown, self._half_open_probe)
+        timer.daemon = True
+        timer.start()
+
+    def _half_open_probe(self):
+        with self._lock:
+            if self.state != OPEN:
+                return
+            self.state = HALF_OPEN
+        start = time.perf_counter()
+        try:
+            if self.probe is not None:
+                self.probe()
+            ok, reason = True, None
+        except Exception as e:
+            ok, reason = False, f"probe failed: {e}"
+        elapsed = time.perf_counter() - start
+        if ok and elapsed > self.latency_slo:
+            ok, reason = False, f"probe took {elapsed:.1f}s, over {self.latency_slo}s"
+        with self._lock:
+            if ok:
+                self.state = CLOSED
+                self._failures = self._slow = 0
+                self._last_reason = None
+                print(f"[INFO] Circuit '{self.name}' closed after a successful probe")
+            else:
+                self._trip(reason)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, "consecutive_slow": self._slow,
+                    "last_reason": self._last_reason, **self._stats}
@@ -0,0 +1,89 @@
+# backend/app/services/connectivity_service.py
+"""
+Cached internet connectivity state.
+
+A daemon thread probes CONNECTIVITY_HOST:CONNECTIVITY_PORT every
+CONNECTIVITY_TTL seconds; request handlers call is_online(), which only reads
+the cached flag and never dials out. An LLM call that cannot reach the
+provider (connection, DNS or timeout error) calls mark_offline(),
+which flips the flag immediately and wakes the monitor to re-probe.
+"""
+import socket
+import threading
+import time
+from typing import Any, Dict
+from app import config
+
+_state: Dict[str, Any] = {"online": False, "checked_at": None, "last_error": None}
+_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+
+
+def probe(host: str = None, port: int = None, timeout: float = None) -> bool:
+    """One TCP connect to the probe target."""
+    host = host or config.CONNECTIVITY_HOST
+    port = port or config.CONNECTIVITY_PORT
+    timeout = config.CONNECTIVITY_TIMEOUT if timeout is None else timeout
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def _refresh():
+    online = probe()
+    with _lock:
+        changed = online != _state["online"]
+        _state.update(online=online, checked_at=time.time())
+        if online:
+            _state["last_error"] = None
+    if changed:
+        print(f"[INFO] Connectivity: {'online' if online else 'offline'}")
+
+
+def _monitor():
+    while True:
+        try:
+            _refresh()
+        except Exception as e:
+            print(f"[WARN] Connectivity probe failed: {e}")
+        _wake.wait(config.CONNECTIVITY_TTL)
+        _wake.clear()
+
+
+def start():
+    """Start the monitor thread (once). Nothing is probed when MODE=offline."""
+    global _thread
+    if config.MODE == "offline":
+        return
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_monitor, name="connectivity-monitor", daemon=True)
+        _thread.start()
+
+
+def is_online() -> bool:
+    """
+    Cached connectivity flag. Starts the monitor on first use; until its
+    first probe completes the service reports offline.
+    """
+    if _thread is None:
+        start()
+    with _lock:
+        return _state["online"]
+
+
+def mark_offline(reason: str = ""):
+    """Invalidate the cached state after a failed outbound call and re-probe now."""
+    with _lock:
+        _state.update(online=False, last_error=reason or None)
+    _wake.set()
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {**_state, "host": config.CONNECTIVITY_HOST, "port": config.CONNECTIVITY_PORT,
+                "ttl": config.CONNECTIVITY_TTL}
@@ -1,26 +1,46 @@
 # backend/app/services/embed_service.py
 import os
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import json
 import hashlib
 import time
-from typing import Dict, List, Tuple, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+from app import config
+from app.services import ann_index, index_store
 
 
 _model = None
-# Cache for preloaded embeddings (no Annoy)
-_embeddings_cache: Dict[str, Tuple[List[Dict[str, Any]], float]] = {}
+_model_name = None
+_model_lock = threading.Lock()
+# Bounded LRU of query embeddings: (model name, normalized text) → read-only vector
+_query_cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+_query_cache_lock = threading.Lock()
+_query_cache_stats = {"hits": 0, "misses": 0}
+# Cache for preloaded embeddings (no Annoy): dir → incrementally refreshed _DirIndex
+_embeddings_cache: Dict[str, "_DirIndex"] = {}
 
 def get_model():
     """Lazy load SentenceTransformer model."""
-    global _model
+    global _model, _model_name
     if _model is None:
-        model_name = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
-        print(f"Loading SentenceTransformer model: {model_name}")
-        _model = SentenceTransformer(model_name)
+        # warm-up and the first request may race to load it
+        with _model_lock:
+            if _model is None:
+                model_name = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+                print(f"Loading SentenceTransformer model: {model_name}")
+                start = time.perf_counter()
+                # imported here so that importing the app doesn't pull in torch
+                from sentence_transformers import SentenceTransformer
+                _model_name = model_name
+                _model = SentenceTransformer(model_name)
+                if config.PROFILE_IMPORTS:
+                    print(f"[INFO] load embedding model {model_name}: {(time.perf_counter() - start) * 1000:.1f} ms")
     return _model
 
+def model_loaded() -> bool:
+    return _model is not None
+
 def embed_text(text: str) -> np.ndarray:
     model = get_model()
     text = text.strip()
@@ -30,79 +50,336 @@ def embed_text(text: str) -> np.ndarray:
     return model.encode(text, convert_to_numpy=True)
 
 
-def _load_dir_embeddings(dir_path: str) -> List[Dict[str, Any]]:
+def embed_query(text: str) -> np.ndarray:
     """
-    Load all embeddings JSON files in a directory into memory.
-    Cache results and reload if files change (by mtime).
+    embed_text for retrieval queries, memoized in a thread-safe LRU keyed on
+    (model name, whitespace-normalized text). The returned array is read-only
+    and shared between callers.
     """
-    cache_key = hashlib.md5(dir_path.encode("utf-8")).hexdigest()
-    latest_mtime = 0
-    for file in os.listdir(dir_path):
-        if file.endswith("_embeddings.json"):
-            latest_mtime = max(latest_mtime, os.path.getmtime(os.path.join(dir_path, file)))
-
-    if cache_key in _embeddings_cache:
-        cached_data, cached_mtime = _embeddings_cache[cache_key]
-        if latest_mtime <= cached_mtime:
-            return cached_data  # use cache
-
-    # Reload embeddings
-    all_sections = []
-    for file in os.listdir(dir_path):
-        if not file.endswith("_embeddings.json"):
-            continue
-        filepath = os.path.join(dir_path, file)
+    get_model()  # sets _model_name
+    key = (_model_name, " ".join(text.split()))
+    with _query_cache_lock:
+        vec = _query_cache.get(key)
+        if vec is not None:
+            _query_cache.move_to_end(key)
+            _query_cache_stats["hits"] += 1
+            return vec
+        _query_cache_stats["misses"] += 1
+
+    vec = embed_text(key[1])
+    vec.setflags(write=False)
+    with _query_cache_lock:
+        _query_cache[key] = vec
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > config.QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return vec
+
+
+def query_cache_stats() -> Dict[str, int]:
+    with _query_cache_lock:
+        return {**_query_cache_stats, "size": len(_query_cache), "max_size": config.QUERY_CACHE_SIZE}
+
+
+def embed_texts(texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+    """
+    Embed many texts with batched forward passes; row i belongs to texts[i].
+    Texts are encoded longest-first so each batch pads to similar lengths,
+    then put back in input order. Empty texts get zero vectors like embed_text.
+    """
+    model = get_model()
+    dim = model.get_sentence_embedding_dimension()
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    stripped = [(i, t.strip()) for i, t in enumerate(texts)]
+    todo = sorted(((i, t) for i, t in stripped if t), key=lambda it: len(it[1]), reverse=True)
+    if not todo:
+        return out
+    vectors = model.encode(
+        [t for _, t in todo],
+        batch_size=batch_size or config.EMBED_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    out[[i for i, _ in todo]] = vectors
+    return out
+
+
+class _DirIndex:
+    """
+    In-memory search index for one directory: a pre-normalized float32 matrix
+    plus a parallel metadata list (row i ↔ meta i), and, once the directory has
+    an IVF index on disk, the inverted list of every row.
+    Each index file is tracked by (mtime, size, inode), so a refresh only reads
+    new or changed files and drops the rows of deleted ones.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Drop every cached row and the ANN state. The lock is kept: callers hold it."""
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.meta: List[Dict[str, Any]] = []
+        # index file path → (signature, first row, row count)
+        self.files: Dict[str, Tuple[Tuple[int, int, int], int, int]] = {}
+        self.ann: Optional[ann_index.IVFIndex] = None
+        self.ann_sig = None
+        self.assign = np.zeros(0, dtype=np.int32)
+        self.lists = None  # (order, offsets) from ann_index.build_lists
+
+    def refresh(self, dir_path: str):
+        self._refresh_ann(dir_path)
+
+        current = {}
+        for filepath in index_store.list_indexes(dir_path):
+            try:
+                st = os.stat(filepath)
+            except FileNotFoundError:
+                continue  # deleted between listdir and stat
+            current[filepath] = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+        stale = [p for p, (sig, _, _) in self.files.items() if current.get(p) != sig]
+        fresh = [p for p, sig in current.items() if p not in self.files or p in stale]
+        if not stale and not fresh:
+            return
+
+        if stale:
+            keep = np.ones(len(self.meta), dtype=bool)
+            for p in stale:
+                _, start, count = self.files.pop(p)
+                keep[start:start + count] = False
+            self.matrix = self.matrix[keep]
+            self.assign = self.assign[keep]
+            self.meta = [m for m, k in zip(self.meta, keep) if k]
+            self._reindex_rows()
+
+        blocks = []
+        for filepath in fresh:
+            block = self._read_file(filepath, current[filepath])
+            if block is not None:
+                blocks.append(block)
+        if blocks:
+            self.matrix = np.concatenate([self.matrix, *(v for v, _ in blocks)]).astype(np.float32, copy=False)
+            self.assign = np.concatenate([self.assign, *(a for _, a in blocks)])
+
+        if self.ann is not None:
+            self.lists = ann_index.build_lists(self.assign, self.ann.n_lists)
+        print(f"[INFO] Index refresh {dir_path}: -{len(stale)} file(s), +{len(fresh)} file(s), {len(self.meta)} rows")
+
+    def _refresh_ann(self, dir_path: str):
+        """Pick up a (re)trained IVF index; a new training run invalidates every row's list."""
+        sig = None
+        if ann_index.enabled():
+            try:
+                st = os.stat(ann_index.centroids_path(dir_path))
+                sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except FileNotFoundError:
+                pass
+        if sig == self.ann_sig:
+            return
+        ann = ann_index.load_index(dir_path) if sig else None
+        if self.files:
+            print(f"[INFO] ANN index changed for {dir_path}; reloading all rows")
+        self._reset()
+        self.ann, self.ann_sig = ann, sig
+
+    def _read_file(self, filepath: str, signature: Tuple[int, int, int]):
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for section in data:
-                    vec = np.array(section.get("vector", []))
-                    if vec.size == 0:
-                        continue
-                    filename = file.replace("_embeddings.json", "")
-                    all_sections.append({
-                        "text": section.get("text", ""),
-                        "document": filename,                        # ✅ use filename
-                        "doc_id": filename,                          # ✅ always filename ID
-                        "doc_name": section.get("document", filename),# pretty title if stored
-                        "page_number": section.get("page_number"),
-                        "excerpt": section.get("excerpt", ""),
-                        "source_file": filename,
-                        "file_mtime": os.path.getmtime(filepath),
-                        "vector": vec
-                    })
+            vectors, _, sections = index_store.read_index(filepath)
         except Exception as e:
             print(f"Error loading {filepath}: {e}")
+            # tracked with no rows, so it isn't re-read until the file changes
+            self.files[filepath] = (signature, len(self.meta), 0)
+            return None
+        if not sections:
+            self.files[filepath] = (signature, len(self.meta), 0)
+            return None
+        dim = self.matrix.shape[1] if len(self.meta) else None
+        if dim is not None and vectors.shape[1] != dim:
+            print(f"Skipping {filepath}: dim {vectors.shape[1]} != {dim}")
+            self.files[filepath] = (signature, len(self.meta), 0)
+            return None
+
+        lists = np.full(len(sections), -1, dtype=np.int32)
+        if self.ann is not None and vectors.shape[1] == self.ann.centroids.shape[1]:
+            lists = ann_index.load_assignments(filepath, self.ann, len(sections))
+            if lists is None:
+                # ingested before the index was trained (or migrated): assign now
+                lists = self.ann.assign(vectors)
+
+        filename = os.path.basename(filepath)[: -len(index_store.VECTORS_SUFFIX)]
+        file_mtime = signature[0] / 1e9
+        self.files[filepath] = (signature, len(self.meta), len(sections))
+        for section in sections:
+            self.meta.append({
+                "text": section.get("text", ""),
+                "document": filename,                        # ✅ use filename
+                "doc_id": filename,                          # ✅ always filename ID
+                "doc_name": section.get("document", filename),# pretty title if stored
+                "page_number": section.get("page_number"),
+                "excerpt": section.get("excerpt", ""),
+                "source_file": filename,
+                "file_mtime": file_mtime,
+            })
+        if dim is None:
+            # first non-empty block defines the matrix shape
+            self.matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        return vectors, lists
+
+    def _reindex_rows(self):
+        row = 0
+        for p in sorted(self.files, key=lambda p: self.files[p][1]):
+            sig, _, count = self.files[p]
+            self.files[p] = (sig, row, count)
+            row += count
 
-    _embeddings_cache[cache_key] = (all_sections, latest_mtime)
-    return all_sections
+    def candidate_rows(self, query: np.ndarray, exact: bool) -> Optional[np.ndarray]:
+        """Rows to score for `query`, or None to score the whole matrix."""
+        if exact or self.ann is None or self.lists is None or len(self.meta) < config.ANN_MIN_ROWS:
+            return None
+        if query.shape[0] != self.ann.centroids.shape[1]:
+            return None
+        order, offsets = self.lists
+        return self.ann.candidates(query, order, offsets, config.ANN_NPROBE)
+
+
+def _get_dir_index(dir_path: str) -> _DirIndex:
+    cache_key = hashlib.md5(dir_path.encode("utf-8")).hexdigest()
+    index = _embeddings_cache.get(cache_key)
+    if index is None:
+        index = _embeddings_cache.setdefault(cache_key, _DirIndex())
+    return index
 
 
-def embed_search_in_dir(query_vec: np.ndarray, dir_path: str, top_k: int = 5) -> List[Dict[str, Any]]:
+def _load_dir_embeddings(dir_path: str) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
     """
-    Perform cosine similarity search using NumPy (fallback without Annoy).
+    Return the directory's (normalized matrix, metadata rows), refreshing the
+    cached index for any index files added, changed or deleted since last call.
     """
-    all_sections = _load_dir_embeddings(dir_path)
-    if not all_sections:
-        return []
+    index = _get_dir_index(dir_path)
+    with index.lock:
+        index.refresh(dir_path)
+        return index.matrix, index.meta
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the `top_k` highest scores, best first, without a full sort."""
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
 
+def _normalize_query(query_vec: np.ndarray) -> Optional[np.ndarray]:
     if not isinstance(query_vec, np.ndarray) or query_vec.size == 0:
         print("Warning: Empty or invalid query vector")
-        return []
-
-    # Normalize query
+        return None
     query_norm = np.linalg.norm(query_vec)
     if query_norm == 0:
+        return None
+    return (query_vec / query_norm).astype(np.float32, copy=False)
+
+
+def _dir_top_k(dir_path: str, query: np.ndarray, top_k: int, exact: bool):
+    """
+    (metadata rows, winner row ids, winner scores) for one directory, best first.
+    Large directories with an IVF index only score the ANN_NPROBE closest lists.
+    """
+    index = _get_dir_index(dir_path)
+    with index.lock:
+        index.refresh(dir_path)
+        matrix, all_sections = index.matrix, index.meta
+        if not all_sections:
+            return [], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if query.shape[-1] != matrix.shape[1]:
+            print(f"Warning: query dim {query.shape[-1]} != index dim {matrix.shape[1]} for {dir_path}")
+            return [], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = index.candidate_rows(query, exact)
+
+    if rows is None:
+        scores = matrix @ query
+        best = _top_k_indices(scores, top_k)
+        return all_sections, best, scores[best]
+    scores = matrix[rows] @ query
+    best = _top_k_indices(scores, top_k)
+    return all_sections, rows[best], scores[best]
+
+
+def embed_search_in_dir(query_vec: np.ndarray, dir_path: str, top_k: int = 5, exact: bool = False) -> List[Dict[str, Any]]:
+    """
+    Cosine similarity search as a single mat-vec over the directory matrix.
+    Pass exact=True to bypass the ANN index. Only the top_k winners are copied
+    out of the metadata array.
+    """
+    query = _normalize_query(query_vec)
+    if query is None:
         return []
 
+    all_sections, rows, scores = _dir_top_k(dir_path, query, top_k, exact)
     results = []
-    for section in all_sections:
-        vec = section["vector"]
-        sim = float(np.dot(query_vec, vec) / (query_norm * np.linalg.norm(vec)))
-        item = dict(section)
-        item.pop("vector", None)  # don’t return big vectors
-        item["score"] = sim
+    for i, score in zip(rows, scores):
+        item = dict(all_sections[i])
+        item["score"] = float(score)
         results.append(item)
+    return results
 
-    results = sorted(results, key=lambda x: x["score"], reverse=True)
-    return results[:top_k]
\ No newline at end of file
+
+def search_collections(
+    query_vec: np.ndarray,
+    collections: Dict[str, str],
+    top_k: int = 5,
+    boosts: Optional[Dict[str, float]] = None,
+    exact: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    One ranked search across several directories.
+    `collections` maps a collection name to its directory; `boosts` adds a
+    per-collection offset to the cosine score. Returns the global top_k, best
+    first, each hit tagged with its "collection".
+    """
+    query = _normalize_query(query_vec)
+    if query is None:
+        return []
+    boosts = boosts or {}
+
+    candidates = []  # (collection, metadata rows, row ids, boosted scores)
+    for name, dir_path in collections.items():
+        if not os.path.isdir(dir_path):
+            continue
+        all_sections, rows, scores = _dir_top_k(dir_path, query, top_k, exact)
+        if len(rows):
+            candidates.append((name, all_sections, rows, scores + boosts.get(name, 0.0)))
+    if not candidates:
+        return []
+
+    # A global top-k over the union equals a top-k over each collection's winners
+    owner = np.concatenate([np.full(len(c[2]), n, dtype=np.int32) for n, c in enumerate(candidates)])
+    local = np.concatenate([np.arange(len(c[2])) for c in candidates])
+    scores = np.concatenate([c[3] for c in candidates])
+
+    results = []
+    for j in _top_k_indices(scores, top_k):
+        name, all_sections, rows, _ = candidates[owner[j]]
+        item = dict(all_sections[rows[local[j]]])
+        item["score"] = float(scores[j])
+        item["collection"] = name
+        results.append(item)
+    return results
+
+
+def warm_up(dir_paths: List[str]) -> Dict[str, int]:
+    """
+    Load the model, run one encode and build the cached index of each directory
+    so the first request doesn't pay for them. Returns rows loaded per directory.
+    """
+    get_model().encode(["warm up"], convert_to_numpy=True, show_progress_bar=False)
+    rows = {}
+    for dir_path in dir_paths:
+        if os.path.isdir(dir_path):
+            rows[dir_path] = int(_load_dir_embeddings(dir_path)[0].shape[0])
+    return rows
@@ -1,26 +1,54 @@
 # app/services/hybrid_service.py
-from app.services import persona_extractor_service, llm_service
+from concurrent.futures import ThreadPoolExecutor
+from app.services import connectivity_service, persona_extractor_service, llm_service
 from app.services.multi_doc_service import merge_and_rank
-from app.utils import internet_available
 from app import config
 
+def _dir_result(future):
+    """One directory's ranking; an empty or unreadable directory counts as no results."""
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"[WARN] Persona ranking failed for one directory: {e}")
+        return {}
+
 def hybrid_search(persona, job, top_k):
     # Always run offline fast
-    same_doc_res = persona_extractor_service.run_persona_extractor(persona, job, config.DOCUMENTS_DIR)
-    other_doc_res = persona_extractor_service.run_persona_extractor(persona, job, config.HISTORICAL_DIR)
-    offline_merged = merge_and_rank(
-        same_doc_res.get("subsection_analysis", []),
-        other_doc_res.get("subsection_analysis", []),
-        top_k
-    )
+    if config.PERSONA_MODE == "indexed":
+        # one ranked pass over the stored vectors of both collections
+        res = persona_extractor_service.rank_indexed_sections(
+            persona, job, config.LIBRARY_COLLECTIONS, boosts=config.COLLECTION_BOOSTS, top_n=top_k
+        )
+        # balanced selection leaves the list out of score order, so re-rank it
+        offline_merged = merge_and_rank(res.get("subsection_analysis", []), [], top_k)
+    else:
+        # run_persona_extractor is re-entrant, so both directories rank concurrently
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            same_future = pool.submit(persona_extractor_service.run_persona_extractor, persona, job, config.DOCUMENTS_DIR)
+            other_future = pool.submit(persona_extractor_service.run_persona_extractor, persona, job, config.HISTORICAL_DIR)
+            same_doc_res, other_doc_res = _dir_result(same_future), _dir_result(other_future)
+        offline_merged = merge_and_rank(
+            same_doc_res.get("subsection_analysis", []),
+            other_doc_res.get("subsection_analysis", []),
+            top_k
+        )
 
     if config.MODE == "offline":
         return {"source": "offline", "recommendations": offline_merged}
 
-    if config.MODE == "online" or (config.MODE == "auto" and internet_available()):
+    if config.MODE == "online" or (config.MODE == "auto" and connectivity_service.is_online()):
+        if not llm_service.llm_breaker.allow():
+            # Gemini is failing or too slow: don't wait for it
+            return {"source": llm_service.SOURCE_BREAKER_OPEN, "recommendations": offline_merged}
         # Pass offline results into LLM for enrichment
-        enriched = llm_service.enrich_with_context(offline_merged, persona, job)
-        return {"source": "hybrid", "offline": offline_merged, "online": enriched}
+        try:
+            texts = [r.get("text", "") for r in offline_merged.get("recommendations", [])]
+            enriched = llm_service.get_llm_service().enrich_with_context(texts, persona, job)
+            return {"source": "hybrid", "offline": offline_merged, "online": enriched}
+        except llm_service.LLMUnavailable:
+            return {"source": llm_service.SOURCE_BREAKER_OPEN, "recommendations": offline_merged}
+        except llm_service.LLMError as e:
+            print(f"[WARN] LLM enrichment failed in hybrid_search: {e}")
 
     # Fallback
     return {"source": "offline-fallback", "recommendations": offline_merged}
@@ -0,0 +1,186 @@
+# backend/app/services/index_store.py
+"""
+On-disk format for per-document embedding indexes.
+
+Each ingested document gets two sidecar files next to its PDF:
+  - <base>_embeddings.npy        raw float32 matrix (one unit-length row per section)
+  - <base>_embeddings.meta.json  compact JSON: document fields + one entry per row
+
+The .npy block is opened with mmap_mode="r", so loading an index never parses
+vectors. Legacy <base>_embeddings.json files (vectors as JSON lists) are read
+once and migrated to the binary format.
+"""
+import os
+import json
+import tempfile
+import numpy as np
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple
+
+VECTORS_SUFFIX = "_embeddings.npy"
+META_SUFFIX = "_embeddings.meta.json"
+LEGACY_SUFFIX = "_embeddings.json"
+# written by ann_index: IVF list id of each row
+ASSIGN_SUFFIX = "_embeddings.ivf.npz"
+
+
+def index_path(dir_path: str, base_name: str) -> str:
+    """Path of the vector block for a document base name (filename without extension)."""
+    return os.path.join(dir_path, f"{base_name}{VECTORS_SUFFIX}")
+
+
+def meta_path_for(vectors_path: str) -> str:
+    return vectors_path[: -len(VECTORS_SUFFIX)] + META_SUFFIX
+
+
+def sidecar_paths(dir_path: str, base_name: str) -> List[str]:
+    """Every file an index for `base_name` may occupy (binary, ANN lists, legacy JSON)."""
+    return [
+        index_path(dir_path, base_name),
+        os.path.join(dir_path, f"{base_name}{META_SUFFIX}"),
+        os.path.join(dir_path, f"{base_name}{ASSIGN_SUFFIX}"),
+        os.path.join(dir_path, f"{base_name}{LEGACY_SUFFIX}"),
+    ]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def atomic_write(path: str, write: Callable[[IO[bytes]], None]):
+    """
+    Call write(f) on a uniquely named temp file in path's directory, then rename
+    it over `path`. Concurrent writers never share a temp file, so readers only
+    ever see a complete file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_index(vectors_path: str, vectors: np.ndarray, document: Dict[str, Any], sections: List[Dict[str, Any]]):
+    """
+    Write a document index. `vectors` row i belongs to `sections[i]`.
+    Rows are stored unit-normalized so search is a plain dot product.
+    Files are written with atomic_write, metadata first, so a reader that sees
+    the .npy always finds matching metadata.
+    """
+    if len(vectors) != len(sections):
+        raise ValueError(f"{len(vectors)} vectors for {len(sections)} sections")
+
+    if sections:
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(sections), -1))
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    meta_path = meta_path_for(vectors_path)
+
+    meta = json.dumps({"document": document, "sections": sections}, ensure_ascii=False, separators=(",", ":"))
+    atomic_write(meta_path, lambda f: f.write(meta.encode("utf-8")))
+    atomic_write(vectors_path, lambda f: np.save(f, matrix))
+
+
+def read_index(vectors_path: str) -> Tuple[np.ndarray, Dict[str, Any], List[Dict[str, Any]]]:
+    """Return (memory-mapped vectors, document fields, per-row section metadata)."""
+    with open(meta_path_for(vectors_path), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    vectors = np.load(vectors_path, mmap_mode="r")
+    sections = meta.get("sections", [])
+    if vectors.ndim != 2 or vectors.shape[0] != len(sections):
+        raise ValueError(f"Index {vectors_path} has {vectors.shape[0]} rows for {len(sections)} sections")
+    return vectors, meta.get("document", {}), sections
+
+
+def migrate_legacy_index(json_path: str) -> str:
+    """
+    Convert a legacy <base>_embeddings.json file to the binary format and remove it.
+    A file with no usable vectors becomes an empty index, so it is tracked like
+    any other document and never parsed again. Returns the new vectors path.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    base_name = os.path.basename(json_path)[: -len(LEGACY_SUFFIX)]
+    vectors = []
+    sections = []
+    document: Dict[str, Any] = {}
+    for section in data:
+        vec = section.get("vector") or []
+        if not vec:
+            continue
+        if vectors and len(vec) != len(vectors[0]):
+            print(f"[WARN] Skipping section with mismatched dim in {json_path}")
+            continue
+        vectors.append(vec)
+        if not document:
+            document = {
+                "doc_id": section.get("doc_id", base_name),
+                "doc_name": section.get("doc_name", base_name),
+                "source_file": section.get("source_file", base_name),
+                "file_mtime": section.get("file_mtime"),
+            }
+        sections.append({
+            "text": section.get("text", ""),
+            "document": section.get("document", base_name),
+            "page_number": section.get("page_number"),
+            "excerpt": section.get("excerpt", ""),
+        })
+
+    if not document:
+        document = {"doc_id": base_name, "doc_name": base_name, "source_file": base_name, "file_mtime": None}
+
+    vectors_path = os.path.join(os.path.dirname(json_path), f"{base_name}{VECTORS_SUFFIX}")
+    matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+    write_index(vectors_path, matrix, document, sections)
+    os.remove(json_path)
+    print(f"[INFO] Migrated legacy index {json_path} → {vectors_path} ({len(sections)} rows)")
+    return vectors_path
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# legacy JSON path → signature of a version that failed to migrate; retried only once it changes
+_failed_migrations: Dict[str, Tuple[int, int, int]] = {}
+
+
+def list_indexes(dir_path: str) -> List[str]:
+    """
+    Vectors paths of every document index in `dir_path`.
+    Legacy JSON indexes without a binary counterpart are migrated on the way.
+    """
+    names = set(os.listdir(dir_path))
+    for name in sorted(names):
+        if not name.endswith(LEGACY_SUFFIX):
+            continue
+        base_name = name[: -len(LEGACY_SUFFIX)]
+        if f"{base_name}{VECTORS_SUFFIX}" in names:
+            continue
+        json_path = os.path.join(dir_path, name)
+        signature = _file_signature(json_path)
+        if signature is not None and _failed_migrations.get(json_path) == signature:
+            continue
+        try:
+            migrated = migrate_legacy_index(json_path)
+            names.add(os.path.basename(migrated))
+            _failed_migrations.pop(json_path, None)
+        except Exception as e:
+            print(f"[ERROR] Failed to migrate {name}: {e}")
+            if signature is not None:
+                _failed_migrations[json_path] = signature
+
+    return [os.path.join(dir_path, n) for n in sorted(names) if n.endswith(VECTORS_SUFFIX)]
@@ -0,0 +1,298 @@
+# backend/app/services/ingest_service.py
+"""
+Ingest pipeline and background job queue.
+
+POST /ingest only saves the uploads and calls submit_job; each job runs on a
+bounded thread pool (INGEST_WORKERS) while GET /ingest/jobs/{id} reports
+per-file progress from the in-memory registry. Within a multi-file job, PDFs
+are parsed concurrently in a process pool (PARSE_WORKERS) and each one is
+embedded as soon as its parse finishes.
+"""
+import os
+import shutil
+import json
+import uuid
+import threading
+import numpy as np
+from collections import OrderedDict
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from app import config
+from app.services.pdf_parser_service import parse_stage
+from app.services.embed_service import embed_texts
+from app.services import ann_index, index_store
+
+_executor = ThreadPoolExecutor(max_workers=config.INGEST_WORKERS, thread_name_prefix="ingest")
+# CPU-bound PyMuPDF parsing for multi-file uploads; created on first use
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+# job id → job dict; oldest finished jobs are dropped past INGEST_JOB_HISTORY
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_jobs_lock = threading.Lock()
+# Serializes ANN index updates (and retrains) per storage directory
+_dir_locks: Dict[str, threading.Lock] = {}
+
+
+def save_embedding_index(section_list: List[Dict[str, Any]], save_path: str, document_info: Dict[str, Any]):
+    """
+    Save embeddings for each section as a binary index (see index_store):
+    a float32 .npy block at `save_path` plus a compact metadata sidecar.
+    The document fields are stored once:
+      - doc_id: filename (canonical ID)
+      - doc_name: pretty title (for display in UI)
+      - source_file: same as doc_id
+    """
+    sections = []
+    doc_name = document_info.get("title", os.path.basename(save_path)[: -len(index_store.VECTORS_SUFFIX)])
+    file_mtime = document_info.get("file_mtime", datetime.utcnow().timestamp())
+    source_file = document_info.get("filename", os.path.basename(save_path))  # always filename.pdf
+
+    texts = []
+    for section in section_list:
+        text = section.get("text", "").strip()
+        if not text:
+            continue
+        texts.append(text)
+        sections.append({
+            "text": text,
+            "document": section.get("document", doc_name),
+            "page_number": section.get("page_number"),
+            "excerpt": section.get("excerpt", text[:200]),
+        })
+
+    vectors = np.zeros((0, 0), dtype=np.float32)
+    if texts:
+        # one batched encode for the whole document instead of a forward pass per section;
+        # a failure propagates so the file is reported as an error, not indexed empty
+        vectors = embed_texts(texts)
+
+    document = {
+        "doc_id": source_file,                     # ✅ filename as canonical ID
+        "doc_name": doc_name,                      # ✅ pretty title
+        "file_mtime": file_mtime,
+        "source_file": source_file                 # ✅ same as doc_id
+    }
+    index_store.write_index(save_path, vectors, document, sections)
+
+    print(f"[INFO] Saved {len(sections)} embeddings → {save_path}")
+
+
+def index_stage(parsed_structure: Dict[str, Any], filename: str, target_dir: str) -> Dict[str, Any]:
+    """Write structure JSON + embeddings index for a parsed PDF; returns the per-file result."""
+    # Save structure JSON
+    structure_filename = f"{os.path.splitext(filename)[0]}_structure.json"
+    structure_path = os.path.join(target_dir, structure_filename)
+    with open(structure_path, "w", encoding="utf-8") as f:
+        json.dump(parsed_structure, f, ensure_ascii=False, indent=2)
+
+    output_structure_path = os.path.join(config.OUTPUT_DIR, structure_filename)
+    shutil.copyfile(structure_path, output_structure_path)
+
+    # Save embeddings index (.npy vectors + metadata sidecar)
+    base_name = os.path.splitext(filename)[0]
+    embeddings_path = index_store.index_path(target_dir, base_name)
+    save_embedding_index(
+        parsed_structure.get("sections", []),
+        embeddings_path,
+        document_info={
+            "title": parsed_structure.get("title"),
+            "file_mtime": parsed_structure.get("file_mtime"),
+            "filename": filename  # ✅ CRITICAL FIX
+        }
+    )
+
+    # Insert into the directory's ANN index (trains it once the library is large enough)
+    with _dir_locks.setdefault(target_dir, threading.Lock()):
+        try:
+            ann_index.add_document(target_dir, embeddings_path)
+        except Exception as e:
+            print(f"[WARN] ANN index update failed for {filename}: {e}")
+
+    output_embeddings_path = index_store.index_path(config.OUTPUT_DIR, base_name)
+    shutil.copyfile(embeddings_path, output_embeddings_path)
+    shutil.copyfile(index_store.meta_path_for(embeddings_path), index_store.meta_path_for(output_embeddings_path))
+
+    return {
+        "status": "ok",
+        "filename": filename,
+        "storage_dir": target_dir,
+        "structure_path": structure_path,
+        "output_structure_path": output_structure_path,
+        "embeddings_path": embeddings_path,
+        "output_embeddings_path": output_embeddings_path
+    }
+
+
+# --- Job queue ---
+
+def submit_job(kind: str, target_dir: str, saved_files: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """
+    Queue already-saved PDFs ([(filename, pdf_path)]) for ingest.
+    Returns a snapshot of the new job.
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "kind": kind,
+        "status": "queued",
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "files": [{"filename": name, "status": "queued"} for name, _ in saved_files],
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        _trim_jobs()
+        snapshot = _snapshot(job)
+    _executor.submit(_run_job, job_id, target_dir, saved_files)
+    return snapshot
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job else None
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    with _jobs_lock:
+        return [_snapshot(j) for j in reversed(_jobs.values())]
+
+
+def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+    snap = dict(job)
+    snap["files"] = [dict(f) for f in job["files"]]
+    snap["progress"] = {
+        "done": sum(1 for f in job["files"] if f["status"] in ("ok", "error")),
+        "total": len(job["files"]),
+    }
+    return snap
+
+
+def _trim_jobs():
+    finished = [jid for jid, j in _jobs.items() if j["status"] in ("done", "error", "failed")]
+    for jid in finished[: max(0, len(_jobs) - config.INGEST_JOB_HISTORY)]:
+        del _jobs[jid]
+
+
+def _set_job(job_id: str, **fields):
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+
+def _set_file(job_id: str, i: int, **fields):
+    with _jobs_lock:
+        _jobs[job_id]["files"][i].update(fields)
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn: forking a process that holds torch/BLAS threads can deadlock
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=config.PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def _reset_parse_pool(pool: Optional[ProcessPoolExecutor]):
+    """
+    Drop `pool` so the next job gets a fresh one. Only the pool this job saw
+    fail is replaced, and nothing is cancelled: other jobs keep the futures
+    they already hold (on a broken pool those fail and are re-parsed inline).
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if pool is None or _parse_pool is not pool:
+            return  # already replaced by another job
+        _parse_pool = None
+    pool.shutdown(wait=False)
+
+
+def _parsed_in_completion_order(job_id: str, saved_files: List[Tuple[str, str]]):
+    """
+    Yield (file index, parsed structure or exception) as each PDF finishes parsing.
+    Multi-file uploads parse concurrently in the process pool; a single file
+    is parsed inline.
+    """
+    if len(saved_files) == 1 or config.PARSE_WORKERS <= 1:
+        for i, (filename, pdf_path) in enumerate(saved_files):
+            _set_file(job_id, i, status="parsing")
+            try:
+                yield i, parse_stage(pdf_path, filename)
+            except Exception as e:
+                yield i, e
+        return
+
+    pool = None
+    try:
+        pool = _get_parse_pool()
+        futures = {pool.submit(parse_stage, pdf_path, filename): i
+                   for i, (filename, pdf_path) in enumerate(saved_files)}
+    except Exception as e:
+        print(f"[WARN] Parse pool unavailable ({e}); parsing inline")
+        _reset_parse_pool(pool)
+        yield from _parse_inline(job_id, saved_files, range(len(saved_files)))
+        return
+    for i in futures.values():
+        _set_file(job_id, i, status="parsing")
+
+    retry = []
+    for future in as_completed(futures):
+        i = futures[future]
+        try:
+            yield i, future.result()
+        except BrokenProcessPool:
+            retry.append(i)
+        except Exception as e:
+            yield i, e
+    if retry:
+        print(f"[WARN] Parse pool crashed; re-parsing {len(retry)} file(s) inline")
+        _reset_parse_pool(pool)
+        yield from _parse_inline(job_id, saved_files, retry)
+
+
+def _parse_inline(job_id: str, saved_files: List[Tuple[str, str]], indices):
+    for i in indices:
+        filename, pdf_path = saved_files[i]
+        _set_file(job_id, i, status="parsing")
+        try:
+            yield i, parse_stage(pdf_path, filename)
+        except Exception as e:
+            yield i, e
+
+
+def _run_job(job_id: str, target_dir: str, saved_files: List[Tuple[str, str]]):
+    """Worker entry point: a job always ends in a terminal status, even on unexpected errors."""
+    try:
+        _process_job(job_id, target_dir, saved_files)
+    except Exception as e:
+        print(f"[ERROR] Ingest job {job_id} failed: {e}")
+        _set_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+
+
+def _process_job(job_id: str, target_dir: str, saved_files: List[Tuple[str, str]]):
+    _set_job(job_id, status="running")
+    # Each PDF moves on to embedding as soon as its parse finishes
+    for i, parsed in _parsed_in_completion_order(job_id, saved_files):
+        filename = saved_files[i][0]
+        if isinstance(parsed, Exception):
+            _set_file(job_id, i, status="error", message=f"Failed to parse PDF: {parsed}")
+            continue
+
+        _set_file(job_id, i, status="embedding")
+        try:
+            _set_file(job_id, i, **index_stage(parsed, filename, target_dir))
+        except Exception as e:
+            print(f"[ERROR] Ingest failed for {filename}: {e}")
+            _set_file(job_id, i, status="error", message=f"Failed to index PDF: {e}")
+
+    with _jobs_lock:
+        job = _jobs[job_id]
+        failed = all(f["status"] == "error" for f in job["files"])
+        job["status"] = "error" if failed and job["files"] else "done"
+        job["finished_at"] = datetime.utcnow().isoformat()
@@ -0,0 +1,104 @@
+# backend/app/services/json_repair.py
+"""
+Tolerant JSON extraction for LLM output.
+
+loads_loose() tries, in order: the text as-is, the first balanced {...}/[...]
+block (ignoring markdown fences and chatter around it), and that block with
+common model mistakes fixed — trailing commas, smart quotes, Python literals
+and single-quoted strings, and brackets left open by a truncated response.
+"""
+import ast
+import json
+import re
+from typing import Any, Optional
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _first_block(text: str) -> Optional[str]:
+    """The first balanced JSON object/array in `text`, or its unterminated tail."""
+    start = next((i for i, ch in enumerate(text) if ch in "{["), None)
+    if start is None:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    quote = ""
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                in_string = False
+        elif ch in "\"'":
+            in_string, quote = True, ch
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _close_open_brackets(text: str) -> str:
+    """Append the closers a truncated response is missing (dropping a dangling string/comma)."""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def _candidates(text: str):
+    yield text
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+        yield text
+    block = _first_block(text)
+    if block is None:
+        return
+    yield block
+    fixed = _TRAILING_COMMA.sub(r"\1", block.translate(_SMART_QUOTES))
+    yield fixed
+    yield _TRAILING_COMMA.sub(r"\1", _close_open_brackets(fixed))
+
+
+def loads_loose(text: str) -> Any:
+    """Parse JSON from LLM output, repairing it locally when possible. Raises ValueError if nothing parses."""
+    text = (text or "").strip()
+    for candidate in _candidates(text):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+        try:
+            # single quotes / True / False / None
+            value = ast.literal_eval(candidate)
+            if isinstance(value, (dict, list)):
+                return value
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            pass
+    raise ValueError("No JSON object could be recovered from the response")
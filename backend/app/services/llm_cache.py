@@ -0,0 +1,131 @@
+# backend/app/services/llm_cache.py
+"""
+Response cache for deterministic-enough LLM calls (enrichment, classification).
+
+Keys hash (kind, prompt template version, model, normalized inputs), so
+editing a prompt only needs a version bump to invalidate old answers.
+Entries live in a size-bounded in-memory LRU with a TTL; with
+LLM_CACHE_BACKEND=sqlite they are also written to LLM_CACHE_PATH and survive
+restarts. Only JSON-serializable values are cached.
+"""
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app import config
+
+
+def normalize(text: str) -> str:
+    return " ".join(str(text or "").split())
+
+
+def make_key(kind: str, version: str, model: str, inputs: Any) -> str:
+    payload = json.dumps([kind, version, model, inputs], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int, ttl: float, db_path: Optional[str] = None, max_disk_entries: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key → (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value (a private copy) or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(entry[1])
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[1], value)
+                    self._stats["disk_hits"] += 1
+                    return copy.deepcopy(value)
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        now = time.time()
+        expires_at = now + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+                )
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                if self.max_disk_entries:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                        "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,),
+                    )
+                self._db.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"[WARN] Failed to persist LLM cache entry: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "size": len(self._memory), "max_size": self.max_entries,
+                    "ttl": self.ttl, "backend": "sqlite" if self._db is not None else "memory"}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache per LLM_CACHE_* settings, or None when LLM_CACHE_BACKEND=off."""
+    global _cache
+    if config.LLM_CACHE_BACKEND == "off":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                db_path = config.LLM_CACHE_PATH if config.LLM_CACHE_BACKEND == "sqlite" else None
+                _cache = LLMResponseCache(config.LLM_CACHE_SIZE, config.LLM_CACHE_TTL, db_path,
+                                          config.LLM_CACHE_DISK_SIZE)
+    return _cache
@@ -0,0 +1,131 @@
+# backend/app/services/llm_executor.py
+"""
+Admission control for LLM calls made from async routes.
+
+Every call takes a slot from its route's semaphore (LLM_ROUTE_LIMITS, default
+LLM_MAX_CONCURRENCY) and from the global one (LLM_MAX_CONCURRENCY). A request
+that can't get both within LLM_QUEUE_TIMEOUT, or arrives while LLM_MAX_QUEUE
+requests are already waiting, is rejected with LLMBusy, which routes turn into
+429 + Retry-After. The recommend routes, whose LLM step is optional, instead
+serve their offline results with source=SOURCE_LLM_BUSY. Blocking SDK calls run on a dedicated thread pool so they
+never stall the event loop or starve the default pool used by offline routes.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List
+from app import config
+
+_pool = ThreadPoolExecutor(max_workers=config.LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+_global_sem = None
+_route_sems: Dict[str, asyncio.Semaphore] = {}
+_waiting = 0
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+# `source` of recommend responses whose optional LLM step was shed
+SOURCE_LLM_BUSY = "offline_llm_busy"
+
+
+class LLMBusy(Exception):
+    def __init__(self, route: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted for '{route}', retry after {retry_after}s")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class Slot:
+    """Admission for one call; release() is idempotent."""
+
+    def __init__(self, route: str, sems: List[asyncio.Semaphore]):
+        self.route = route
+        self._sems = sems
+
+    def release(self):
+        sems, self._sems = self._sems, []
+        for sem in sems:
+            sem.release()
+        if sems:
+            _route_stats(self.route)["in_flight"] -= 1
+
+
+def _route_stats(route: str) -> Dict[str, int]:
+    return _stats.setdefault(route, {"admitted": 0, "rejected": 0, "in_flight": 0})
+
+
+def _semaphores(route: str) -> List[asyncio.Semaphore]:
+    # created lazily so they belong to the server's event loop
+    global _global_sem
+    if _global_sem is None:
+        _global_sem = asyncio.Semaphore(config.LLM_MAX_CONCURRENCY)
+    if route not in _route_sems:
+        _route_sems[route] = asyncio.Semaphore(config.LLM_ROUTE_LIMITS.get(route, config.LLM_MAX_CONCURRENCY))
+    return [_route_sems[route], _global_sem]
+
+
+def _reject(route: str):
+    _route_stats(route)["rejected"] += 1
+    return LLMBusy(route, config.LLM_RETRY_AFTER)
+
+
+async def acquire(route: str) -> Slot:
+    """Wait (at most LLM_QUEUE_TIMEOUT) for a slot for `route`; raises LLMBusy."""
+    global _waiting
+    sems = _semaphores(route)
+    if any(sem.locked() for sem in sems) and _waiting >= config.LLM_MAX_QUEUE:
+        raise _reject(route)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.LLM_QUEUE_TIMEOUT
+    acquired = []
+    _waiting += 1
+    try:
+        for sem in sems:
+            if sem.locked():
+                await asyncio.wait_for(sem.acquire(), max(0.0, deadline - loop.time()))
+            else:
+                await sem.acquire()
+            acquired.append(sem)
+    except asyncio.TimeoutError:
+        for sem in acquired:
+            sem.release()
+        raise _reject(route)
+    except BaseException:
+        # cancelled (e.g. client went away) while waiting: give back what we hold
+        for sem in acquired:
+            sem.release()
+        raise
+    finally:
+        _waiting -= 1
+
+    stats = _route_stats(route)
+    stats["admitted"] += 1
+    stats["in_flight"] += 1
+    return Slot(route, acquired)
+
+
+@asynccontextmanager
+async def slot(route: str):
+    """`async with slot(route):` around async LLM work (agenerate/astream)."""
+    admitted = await acquire(route)
+    try:
+        yield admitted
+    finally:
+        admitted.release()
+
+
+async def run(route: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking LLM call on the LLM thread pool once admitted."""
+    async with slot(route):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool, functools.partial(fn, *args, **kwargs))
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "max_concurrency": config.LLM_MAX_CONCURRENCY,
+        "route_limits": config.LLM_ROUTE_LIMITS,
+        "waiting": _waiting,
+        "routes": {route: dict(s) for route, s in _stats.items()},
+    }
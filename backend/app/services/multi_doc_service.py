@@ -64,6 +64,27 @@ def merge_and_rank(same_subs: List[Dict[str,Any]], other_subs: List[Dict[str,Any
     # Sort by primary search score first, then by label_score (if applicable)
     unique.sort(key=lambda x: (x.get('score',0), x.get('label_score',0)), reverse=True)
 
+    return _label_and_build(unique, top_k)
+
+def rank_hits(hits: List[Dict[str,Any]], top_k: int=5) -> Dict[str, Any]:
+    """
+    Same output as merge_and_rank for hits that are already one ranked list
+    (embed_service.search_collections): one dedup pass, no re-sort.
+    """
+    seen = set()
+    unique = []
+    for h in hits:
+        s = dict(h)
+        s['text'] = clean_text(s.get('text',''))
+        k = (s.get('document',''), s.get('page_number',''), hashlib.md5(s['text'].encode('utf-8')).hexdigest())
+        if k in seen:
+            continue
+        seen.add(k)
+        unique.append(s)
+    return _label_and_build(unique, top_k)
+
+def _label_and_build(unique: List[Dict[str,Any]], top_k: int) -> Dict[str, Any]:
+    """Label ranked, deduplicated subsections and build the response + time machine."""
     # Label classification:
     # (Limitation: This keyword-based approach is simple and fast, but can be inaccurate/brittle.
     # For higher quality and nuanced classification, consider using a dedicated text classification
@@ -104,7 +125,8 @@ def merge_and_rank(same_subs: List[Dict[str,Any]], other_subs: List[Dict[str,Any
             "score": float(u.get("score", 0)),
             "label": u.get("label"),
             "label_score": float(u.get("label_score", 0)),
-            "file_mtime": u.get("file_mtime", "") # Ensure file_mtime is passed through for time_machine
+            "file_mtime": u.get("file_mtime", ""), # Ensure file_mtime is passed through for time_machine
+            "collection": u.get("collection"),
         })
     return {"recommendations": result, "time_machine": time_machine}
 
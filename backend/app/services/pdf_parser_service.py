@@ -1,21 +1,27 @@
 # backend/app/services/pdf_parser_service.py
-import fitz
+import os
 import re
+from datetime import datetime
+from typing import List, Dict, Any
 from app.utils import clean_text, excerpt
+from engines.round1a.processor import extract_document_structure, extract_pages
 
 HEADING_PATTERN = re.compile(r"^(\d+(\.\d+)*)\s+|^(ABSTRACT|INTRODUCTION|CONCLUSION|REFERENCES)$", re.I)
 
-def parse_pdf(pdf_path: str):
+def parse_pdf(pdf_path: str, extracted: Dict[str, Any] = None):
     """
     Parse PDF into structured sections.
     Skips cover/title pages, filters metadata, and builds clean sections with snippets.
+    Pass `extracted` (round1a extract_pages) to reuse a single pass over the PDF.
     """
-    doc = fitz.open(pdf_path)
+    extracted = extracted or extract_pages(pdf_path)
     sections = []
     current = {"heading": None, "content": []}
+    page_num = 0
 
-    for page_num, page in enumerate(doc, start=1):
-        text = page.get_text("text")
+    for page in extracted["pages"]:
+        page_num = page["number"]
+        text = page["text"]
         lines = [clean_text(l) for l in text.split("\n") if l.strip()]
 
         # --- Heuristic: Skip likely cover/title pages ---
@@ -55,4 +61,55 @@ def parse_pdf(pdf_path: str):
             "snippet": excerpt(text_block, max_sentences=3)
         })
 
-    return {"title": doc.metadata.get("title") or "Untitled", "outline": sections}
+    return {"title": extracted["metadata"].get("title") or "Untitled", "outline": sections}
+
+
+def normalize_sections(parsed_structure: Dict[str, Any], pdf_path: str) -> List[Dict[str, Any]]:
+    """
+    Normalize sections from parsed structure.
+    Fallback: outline or full text if there are no sections.
+    """
+    sections = []
+
+    if parsed_structure.get("sections"):
+        for sec in parsed_structure["sections"]:
+            text = sec.get("text", "").strip()
+            if text:
+                sections.append({
+                    "text": text,
+                    "page_number": sec.get("page_number"),
+                    "excerpt": sec.get("excerpt", text[:200]),
+                    "document": parsed_structure.get("title") or os.path.basename(pdf_path)
+                })
+
+    if not sections:
+        combined_text = parsed_structure.get("text", "")
+        if not combined_text and parsed_structure.get("outline"):
+            combined_text = " ".join([h.get("text", "") for h in parsed_structure["outline"]])
+        if combined_text.strip():
+            sections.append({
+                "text": combined_text.strip(),
+                "page_number": 1,
+                "excerpt": combined_text.strip()[:200],
+                "document": parsed_structure.get("title") or os.path.basename(pdf_path)
+            })
+
+    return sections
+
+
+def parse_stage(pdf_path: str, filename: str) -> Dict[str, Any]:
+    """
+    Parse + extract structure for one saved PDF (ingest's CPU-bound stage).
+    Top-level and import-light so it can run in a worker process.
+    """
+    extracted = extract_pages(pdf_path)  # one open + one walk over the pages
+    parsed_structure = parse_pdf(pdf_path, extracted)
+    outline_data = extract_document_structure(pdf_path, extracted)
+
+    parsed_structure["outline"] = outline_data.get("outline", [])
+    parsed_structure["title"] = outline_data.get("title", os.path.splitext(filename)[0])
+    parsed_structure["file_mtime"] = os.path.getmtime(pdf_path)
+    parsed_structure["sections"] = normalize_sections(parsed_structure, pdf_path)
+    parsed_structure["uploaded_at"] = datetime.utcnow().isoformat()
+    parsed_structure["source_pdf"] = pdf_path
+    return parsed_structure
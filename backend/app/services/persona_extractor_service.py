@@ -1,46 +1,93 @@
 # backend/app/services/persona_extractor_service.py
-import os, json
-from typing import Dict, Any, List
+import os
+from typing import Dict, Any, List, Optional, Union
 from app import config
 from app.utils import clean_text, excerpt, file_mtime_iso
 
-# We expect engines/round1b/persona_extractor.py to export process_pdfs(persona, job).
-# The wrapper will call it and normalize structure to have:
+# We call engines/round1b/persona_extractor.run_pipeline(persona, job, input_dirs, model)
+# directly: it returns the result in memory, with no module globals or temp file,
+# so concurrent persona queries don't race. The wrapper normalizes it to:
 # { metadata:..., subsection_analysis: [ {document, refined_text, page_number, score?} ] }
 
 ENG_ROUND1B = "engines.round1b.persona_extractor"
 
-def run_persona_extractor(persona: str, job: str, input_dir: str) -> Dict[str, Any]:
-    # Monkeypatch input dir if round1b uses global constants:
-    # Some versions of your round1b use INPUT_DIR/OUTPUT_FILE constants; we set env or attributes if required.
+def run_persona_extractor(persona: str, job: str, input_dirs: Union[str, List[str]]) -> Dict[str, Any]:
     import importlib
     try:
         module = importlib.import_module(ENG_ROUND1B)
     except Exception as e:
         raise RuntimeError(f"Could not import round1b engine ({ENG_ROUND1B}): {e}")
+    if not hasattr(module, "run_pipeline"):
+        raise RuntimeError("Round1b engine must export run_pipeline(persona, job, input_dirs)")
+    from app.services.embed_service import get_model
 
-    # If the module exposes process_pdfs(persona,job) use it
-    if hasattr(module, "process_pdfs"):
-        # Some modules expect INPUT_DIR and OUTPUT_FILE constants; set attributes if present
-        setattr(module, "INPUT_DIR", input_dir)
-        setattr(module, "OUTPUT_FILE", os.path.join(config.OUTPUT_DIR, "persona_temp_output.json"))
-        # Call and retrieve file-based or returned result
-        result = module.process_pdfs(persona, job)
-        # If the module wrote to OUTPUT_FILE, try to read it
-        if isinstance(result, dict):
-            return _normalize_result(result, input_dir)
-        else:
-            # some older code writes file but returns None
-            outf = getattr(module, "OUTPUT_FILE", None)
-            if outf and os.path.exists(outf):
-                with open(outf, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                return _normalize_result(data, input_dir)
-            return {"metadata": {}, "subsection_analysis": []}
-    else:
-        raise RuntimeError("Round1b engine must export process_pdfs(persona, job)")
+    if isinstance(input_dirs, str):
+        input_dirs = [input_dirs]
+    input_dirs = [d for d in input_dirs if os.path.isdir(d)]
+    # share the process-wide embedding model instead of loading one per call
+    result = module.run_pipeline(persona, job, input_dirs, model=get_model(), cache_dir=config.ROUND1B_CACHE_DIR)
+    return _normalize_result(result, input_dirs)
 
-def _normalize_result(raw: Dict[str, Any], input_dir: str) -> Dict[str, Any]:
+def rank_indexed_sections(persona: str, job: str, collections: Dict[str, str],
+                          boosts: Optional[Dict[str, float]] = None,
+                          top_n: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Round1b-style persona ranking over the vectors ingest already stored:
+    the persona/job reference is embedded once with the shared embed_service
+    model, candidates come from search_collections (with per-collection
+    `boosts`, as in the online routes), and the engine's keyword
+    boost, balanced selection of `top_n` sections (default: the engine's
+    TOP_SECTIONS_COUNT) and refinement are applied on top.
+    No PDF is re-read and nothing is re-encoded.
+    """
+    import importlib
+    try:
+        module = importlib.import_module(ENG_ROUND1B)
+    except Exception as e:
+        raise RuntimeError(f"Could not import round1b engine ({ENG_ROUND1B}): {e}")
+    from app.services.embed_service import embed_query, search_collections
+
+    reference_vec = embed_query(f"Persona: {persona}. Task: {job}")
+    hits = search_collections(reference_vec, collections, top_k=config.PERSONA_CANDIDATES, boosts=boosts)
+    count_keywords = module.keyword_matcher(module.extract_keywords(persona + " " + job))
+
+    ranked = []
+    for h in hits:
+        content = h.get("text", "")
+        keyword_boost = count_keywords(content.lower())
+        ranked.append({
+            "document": h.get("document", ""),
+            "page_number": h.get("page_number"),
+            "title": h.get("doc_name", ""),
+            "content": content,
+            "relevance_score": h.get("score", 0.0) + 0.02 * keyword_boost,
+            "file_mtime": h.get("file_mtime"),
+            "collection": h.get("collection"),
+        })
+    ranked.sort(key=lambda x: x["relevance_score"], reverse=True)
+    if top_n is None:
+        top_n = module.TOP_SECTIONS_COUNT
+    top_chunks = module.select_hybrid_top_chunks(ranked, top_n)
+
+    raw = {
+        "metadata": {
+            "input_documents": sorted({h.get("document", "") for h in hits}),
+            "persona": persona,
+            "job_to_be_done": job,
+            "mode": "indexed",
+        },
+        "subsection_analysis": [{
+            "document": ch["document"],
+            "refined_text": module.refine_chunk_text(ch["content"]),
+            "page_number": ch["page_number"],
+            "score": ch["relevance_score"],
+            "file_mtime": ch["file_mtime"],
+            "collection": ch["collection"],
+        } for ch in top_chunks],
+    }
+    return _normalize_result(raw, [])
+
+def _normalize_result(raw: Dict[str, Any], input_dirs: List[str]) -> Dict[str, Any]:
     # raw expected keys: metadata, subsection_analysis
     meta = raw.get("metadata", {})
     subs = raw.get("subsection_analysis", [])
@@ -51,15 +98,22 @@ def _normalize_result(raw: Dict[str, Any], input_dir: str) -> Dict[str, Any]:
         text = s.get("refined_text") or s.get("content") or s.get("text") or ""
         page = s.get("page_number") or s.get("page") or None
         score = float(s.get("score", 0)) if s.get("score") is not None else 0.0
-        # store file mtime so time-machine can use it
-        docpath = os.path.join(input_dir, doc) if doc else ""
-        mtime = file_mtime_iso(docpath) if docpath and os.path.exists(docpath) else ""
+        # store file mtime so time-machine can use it (indexed results already carry it)
+        mtime = s.get("file_mtime")
+        if mtime is None:
+            mtime = ""
+            for input_dir in input_dirs if doc else []:
+                docpath = os.path.join(input_dir, doc)
+                if os.path.exists(docpath):
+                    mtime = file_mtime_iso(docpath)
+                    break
         norm_subs.append({
             "document": doc,
             "page_number": page,
             "text": clean_text(text),
             "excerpt": excerpt(text, max_chars=300),
             "score": score,
-            "file_mtime": mtime
+            "file_mtime": mtime,
+            "collection": s.get("collection"),
         })
     return {"metadata": meta, "subsection_analysis": norm_subs}
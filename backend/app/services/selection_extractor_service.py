@@ -1,11 +1,7 @@
-import os
-from app.services.embed_service import embed_text, embed_search_in_dir
+from app import config
+from app.services.embed_service import embed_query, search_collections
 
-def find_relevant_sections(query_text: str, dir_path: str):
-    if not os.path.exists(dir_path):
-        return []
-    # embed query
-    query_vec = embed_text(query_text)
-    # search all sections/snippets in this dir
-    results = embed_search_in_dir(query_vec, dir_path)
-    return results
+def search_library(query_text: str, top_k: int = 5):
+    """Search current + historical documents in one ranked pass; hits carry their "collection"."""
+    query_vec = embed_query(query_text)
+    return search_collections(query_vec, config.LIBRARY_COLLECTIONS, top_k=top_k, boosts=config.COLLECTION_BOOSTS)
@@ -1,12 +1,46 @@
 import os
+import re
+import json
+import glob
+import hashlib
+import time
+import random
+import threading
 import subprocess
+import tempfile
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import uuid
+from typing import Any, Callable, Dict, List
 
 # Base URL for constructing web-accessible file URLs
 BASE_URL = "http://127.0.0.1:8000"
 
+# Cloud providers get the script in chunks of at most this many UTF-8 bytes
+# (GCP rejects requests over 5000 bytes, Azure OpenAI TTS inputs over 4096 chars)
+CHUNK_BYTES = {"azure": 4000, "gcp": 4500, "stub": 4500}
+if os.getenv("TTS_CHUNK_BYTES"):
+    CHUNK_BYTES = {p: int(os.getenv("TTS_CHUNK_BYTES")) for p in CHUNK_BYTES}
+# Chunks synthesized concurrently across all requests, and retries per chunk
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+TTS_CHUNK_RETRIES = int(os.getenv("TTS_CHUNK_RETRIES", "2"))
+
+_tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+_gcp_client = None
+_gcp_client_lock = threading.Lock()
+_http = requests.Session()
+
+# Podcast files are named by a hash of what produced them, so repeats are served
+# from disk. podcast_* files in the output dir are evicted once older than
+# PODCAST_CACHE_MAX_AGE seconds or, oldest-used first, while the total exceeds
+# PODCAST_CACHE_MAX_BYTES.
+PODCAST_CACHE_MAX_BYTES = int(os.getenv("PODCAST_CACHE_MAX_BYTES", str(1024 ** 3)))
+PODCAST_CACHE_MAX_AGE = float(os.getenv("PODCAST_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+_podcast_stats = {"hits": 0, "misses": 0, "evicted": 0, "evicted_bytes": 0}
+_podcast_lock = threading.Lock()
+# filename -> [lock, number of requests holding or waiting on it]
+_inflight: Dict[str, list] = {}
+
 def generate_audio(text: str, output_dir: str, provider: str = None, voice: str = None) -> dict:
     """
     Unified function to generate audio from text. It dispatches to the correct provider
@@ -25,32 +59,242 @@ def generate_audio(text: str, output_dir: str, provider: str = None, voice: str
         raise ValueError("Text cannot be empty")
     
     provider = (provider or os.getenv("TTS_PROVIDER", "local")).lower()
+    if provider == "google":
+        provider = "gcp"  # config.TTS_PROVIDER's name for it
     
     # Ensure the output directory exists
     Path(output_dir).mkdir(parents=True, exist_ok=True)
-    filename = f"podcast_{provider}_{uuid.uuid4().hex}.mp3"
+    filename = f"podcast_{provider}_{_audio_key(text, provider, voice)}.mp3"
     output_file = os.path.join(output_dir, filename)
+    full_url = f"{BASE_URL}/static/output/{filename}"
+
+    # Identical requests share one synthesis; later ones find the file
+    with _podcast_lock:
+        entry = _inflight.setdefault(filename, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            try:
+                os.utime(output_file)  # mark as recently used for eviction
+            except FileNotFoundError:
+                pass  # not cached, or evicted by a concurrent request: synthesize it
+            else:
+                with _podcast_lock:
+                    _podcast_stats["hits"] += 1
+                return {"url": full_url, "provider": provider, "cached": True}
+            with _podcast_lock:
+                _podcast_stats["misses"] += 1
+            result = _synthesize_file(text, provider, voice, output_file)
+    finally:
+        # the key's lock stays registered until its last waiter is done
+        with _podcast_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                _inflight.pop(filename, None)
+    if "error" not in result:
+        result["url"] = full_url
+        evict_podcasts(output_dir, keep=output_file)
+    return result
 
+
+def _audio_key(text: str, provider: str, voice: str = None) -> str:
+    """Hash of everything that determines the audio: script, provider, voice and audio settings."""
+    if provider == "azure":
+        voice = voice or os.getenv("AZURE_TTS_VOICE", "alloy")
+        audio_config = [os.getenv("AZURE_TTS_DEPLOYMENT", "tts"), os.getenv("AZURE_TTS_API_VERSION", "2024-02-15-preview")]
+    elif provider == "gcp":
+        voice = voice or os.getenv("GCP_TTS_VOICE", "en-US-Neural2-C")
+        audio_config = [os.getenv("GCP_TTS_LANGUAGE", "en-US"), "MP3"]
+    else:
+        audio_config = []
+    payload = json.dumps([text, provider, voice, audio_config, CHUNK_BYTES.get(provider)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _synthesize_file(text: str, provider: str, voice: str, output_file: str) -> dict:
+    # Audio is written to a unique temp file (hidden, so the podcast_*.mp3 glob
+    # never sees it) and renamed into place, so output_file is always complete
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(output_file), prefix=".podcast_", suffix=".part.mp3")
+    os.close(fd)
     try:
-        if provider == "azure":
-            _generate_azure_tts(text, output_file, voice)
-        elif provider == "gcp":
-            _generate_gcp_tts(text, output_file, voice)
+        synthesizers = {"azure": _synthesize_azure, "gcp": _synthesize_gcp, "stub": _synthesize_stub}
+        chunks = 1
+        if provider in synthesizers:
+            pieces = split_script(text, CHUNK_BYTES[provider])
+            chunks = len(pieces)
+            audio = _synthesize_chunks(synthesizers[provider], pieces, voice)
+            with open(tmp, "wb") as f:
+                f.write(audio)
         elif provider == "local":
-            _generate_local_tts(text, output_file, voice)
+            # pyttsx3 writes the file itself, so the script goes in whole
+            _generate_local_tts(text, tmp, voice)
         else:
             raise ValueError(f"Unsupported TTS_PROVIDER: {provider}")
+        os.replace(tmp, output_file)
+        print(f"{provider} TTS audio ({chunks} chunks) saved to: {output_file}")
         
-        # If successful, return the full, web-accessible URL
-        full_url = f"{BASE_URL}/static/output/{filename}"
-        return {"url": full_url, "provider": provider}
+        return {"provider": provider, "chunks": chunks, "cached": False}
 
     except Exception as e:
         print(f"[ERROR] TTS generation failed for provider '{provider}': {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
         return {"error": f"TTS generation failed: {e}"}
 
-def _generate_azure_tts(text, output_file, voice=None):
-    """Generates audio using Azure OpenAI TTS."""
+def _podcast_files(output_dir: str) -> List[str]:
+    return glob.glob(os.path.join(glob.escape(output_dir), "podcast_*.mp3"))
+
+
+def evict_podcasts(output_dir: str, keep: str = None) -> int:
+    """
+    Delete podcast files older than PODCAST_CACHE_MAX_AGE, then the least recently
+    used ones until the rest fit in PODCAST_CACHE_MAX_BYTES. `keep` is never deleted.
+    Returns the number of files removed.
+    """
+    entries = []
+    for path in _podcast_files(output_dir):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()  # oldest first
+
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    removed = freed = 0
+    for mtime, size, path in entries:
+        if path == keep:
+            continue
+        if now - mtime <= PODCAST_CACHE_MAX_AGE and total <= PODCAST_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+        freed += size
+    if removed:
+        with _podcast_lock:
+            _podcast_stats["evicted"] += removed
+            _podcast_stats["evicted_bytes"] += freed
+        print(f"[INFO] Evicted {removed} podcast files ({freed} bytes) from {output_dir}")
+    return removed
+
+
+def podcast_cache_stats(output_dir: str) -> Dict[str, Any]:
+    sizes = []
+    for path in _podcast_files(output_dir):
+        try:
+            sizes.append(os.path.getsize(path))
+        except FileNotFoundError:
+            continue
+    with _podcast_lock:
+        stats = dict(_podcast_stats)
+    return {**stats, "files": len(sizes), "bytes": sum(sizes),
+            "max_bytes": PODCAST_CACHE_MAX_BYTES, "max_age": PODCAST_CACHE_MAX_AGE}
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _split_long(text: str, max_bytes: int) -> List[str]:
+    """Split one paragraph into pieces under max_bytes: sentences, then words, then bytes."""
+    units = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        if _utf8_len(sentence) <= max_bytes:
+            units.append(sentence)
+            continue
+        for word in sentence.split():
+            while _utf8_len(word) > max_bytes:
+                # always take at least one character, even if it alone is over max_bytes
+                head = word.encode("utf-8")[:max_bytes].decode("utf-8", "ignore") or word[0]
+                units.append(head)
+                word = word[len(head):]
+            if word:
+                units.append(word)
+    return units
+
+
+def split_script(text: str, max_bytes: int) -> List[str]:
+    """
+    Split a script into chunks of at most max_bytes UTF-8 bytes, breaking on
+    paragraph boundaries where possible and on sentence (then word) boundaries
+    inside paragraphs that are too long. Neighbouring pieces are packed together.
+    """
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        units = [paragraph] if _utf8_len(paragraph) <= max_bytes else _split_long(paragraph, max_bytes)
+        for i, unit in enumerate(units):
+            sep = "\n\n" if i == 0 else " "
+            if current and _utf8_len(current + sep + unit) <= max_bytes:
+                current += sep + unit
+            else:
+                if current:
+                    chunks.append(current)
+                current = unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _strip_id3(data: bytes) -> bytes:
+    """Drop a leading ID3v2 tag so segments can be joined into one MP3 stream."""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return data[10 + size:]
+    return data
+
+
+def _is_transient(e: Exception) -> bool:
+    """Timeouts, dropped connections, 429 and 5xx are worth retrying; config and input errors are not."""
+    if isinstance(e, (requests.Timeout, requests.ConnectionError, TimeoutError, ConnectionError)):
+        return True
+    response = getattr(e, "response", None)
+    # requests' HTTPError carries the response; google.api_core errors carry the HTTP code
+    status = getattr(response, "status_code", None) if response is not None else getattr(e, "code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def _synthesize_with_retries(synthesize: Callable[[str, str], bytes], chunk: str, voice: str, index: int,
+                             failed: threading.Event) -> bytes:
+    for attempt in range(TTS_CHUNK_RETRIES + 1):
+        if failed.is_set():
+            # another chunk of this podcast already failed; don't pay for this one
+            raise RuntimeError(f"TTS chunk {index + 1} skipped after an earlier chunk failed")
+        try:
+            return synthesize(chunk, voice)
+        except Exception as e:
+            if attempt == TTS_CHUNK_RETRIES or not _is_transient(e):
+                failed.set()
+                raise
+            delay = random.uniform(0, 0.5 * (2 ** attempt))
+            print(f"[WARN] TTS chunk {index + 1} failed ({e}); retry {attempt + 1}/{TTS_CHUNK_RETRIES} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def _synthesize_chunks(synthesize: Callable[[str, str], bytes], chunks: List[str], voice: str) -> bytes:
+    """Synthesize chunks on the shared TTS pool and join the MP3 segments in script order."""
+    failed = threading.Event()
+    futures = [_tts_pool.submit(_synthesize_with_retries, synthesize, chunk, voice, i, failed)
+               for i, chunk in enumerate(chunks)]
+    try:
+        segments = [f.result() for f in futures]
+    except Exception:
+        failed.set()  # chunks already running stop before their next attempt
+        for f in futures:
+            f.cancel()
+        raise
+    return segments[0] + b"".join(_strip_id3(seg) for seg in segments[1:])
+
+
+def _synthesize_azure(text, voice=None) -> bytes:
+    """Synthesizes one chunk with Azure OpenAI TTS."""
     api_key = os.getenv("AZURE_TTS_KEY")
     endpoint = os.getenv("AZURE_TTS_ENDPOINT")
     deployment = os.getenv("AZURE_TTS_DEPLOYMENT", "tts")
@@ -63,24 +307,29 @@ def _generate_azure_tts(text, output_file, voice=None):
     headers = {"api-key": api_key, "Content-Type": "application/json"}
     payload = {"model": deployment, "input": text, "voice": voice}
     
-    response = requests.post(
+    response = _http.post(
         f"{endpoint}/openai/deployments/{deployment}/audio/speech?api-version={api_version}",
         headers=headers, json=payload, timeout=60
     )
     response.raise_for_status()
-    
-    with open(output_file, "wb") as f:
-        f.write(response.content)
-    print(f"Azure TTS audio saved to: {output_file}")
+    return response.content
 
-def _generate_gcp_tts(text, output_file, voice=None):
-    """Generates audio using Google Cloud Text-to-Speech."""
+def _get_gcp_client():
+    global _gcp_client
+    if _gcp_client is None:
+        with _gcp_client_lock:
+            if _gcp_client is None:
+                from google.cloud import texttospeech
+                _gcp_client = texttospeech.TextToSpeechClient()
+    return _gcp_client
+
+def _synthesize_gcp(text, voice=None) -> bytes:
+    """Synthesizes one chunk with Google Cloud Text-to-Speech."""
     from google.cloud import texttospeech
     
     if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
         raise ValueError("GOOGLE_APPLICATION_CREDENTIALS must be set for Google Cloud TTS.")
 
-    client = texttospeech.TextToSpeechClient()
     synthesis_input = texttospeech.SynthesisInput(text=text)
     voice_params = texttospeech.VoiceSelectionParams(
         language_code=os.getenv("GCP_TTS_LANGUAGE", "en-US"),
@@ -88,17 +337,27 @@ def _generate_gcp_tts(text, output_file, voice=None):
     )
     audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
     
-    response = client.synthesize_speech(
+    response = _get_gcp_client().synthesize_speech(
         input=synthesis_input, voice=voice_params, audio_config=audio_config
     )
-    with open(output_file, "wb") as f:
-        f.write(response.audio_content)
-    print(f"Google Cloud TTS audio saved to: {output_file}")
+    return response.audio_content
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, ~26 ms)
+_SILENT_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+def _synthesize_stub(text, voice=None) -> bytes:
+    """
+    Offline stand-in (TTS_PROVIDER=stub) for tests and demos: returns silent MP3
+    frames, about 0.25 s per word. TTS_STUB_DELAY adds per-chunk latency.
+    """
+    delay = float(os.getenv("TTS_STUB_DELAY", "0"))
+    if delay:
+        time.sleep(delay)
+    return _SILENT_FRAME * (10 * max(1, len(text.split())))
 
 def _generate_local_tts(text, output_file, voice=None):
     """Generates audio using local pyttsx3."""
     import pyttsx3
     engine = pyttsx3.init()
     engine.save_to_file(text, output_file)
-    engine.runAndWait()
-    print(f"Local TTS (pyttsx3) audio saved to: {output_file}")
\ No newline at end of file
+    engine.runAndWait()
\ No newline at end of file
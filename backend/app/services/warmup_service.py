@@ -0,0 +1,71 @@
+# backend/app/services/warmup_service.py
+"""
+Background warm-up run at application startup: load the embedding model,
+run a dummy encode and build the cached index of every library directory.
+Failures are retried WARMUP_RETRIES times with exponential backoff. /ready
+reports 503 until warm-up has finished; if it gave up, the app counts as
+ready once a request has loaded the model lazily.
+"""
+import threading
+import time
+import traceback
+from typing import Any, Dict
+from app import config
+from app.services import embed_service
+
+_state: Dict[str, Any] = {"status": "pending", "started_at": None, "finished_at": None, "rows": {},
+                          "attempts": 0, "error": None}
+_lock = threading.Lock()
+_thread = None
+
+
+def _run():
+    start = time.time()
+    for attempt in range(config.WARMUP_RETRIES + 1):
+        with _lock:
+            _state["attempts"] = attempt + 1
+        try:
+            rows = embed_service.warm_up(list(config.LIBRARY_COLLECTIONS.values()))
+            with _lock:
+                _state.update(status="ready", rows=rows, error=None, finished_at=time.time())
+            print(f"[INFO] Warm-up finished in {time.time() - start:.1f}s: {rows}")
+            return
+        except Exception as e:
+            traceback.print_exc()
+            with _lock:
+                _state["error"] = str(e)
+            if attempt == config.WARMUP_RETRIES:
+                break
+            delay = config.WARMUP_BACKOFF * (2 ** attempt)
+            print(f"[WARN] Warm-up failed ({e}); retry {attempt + 1}/{config.WARMUP_RETRIES} in {delay:.0f}s")
+            time.sleep(delay)
+    with _lock:
+        _state.update(status="failed", finished_at=time.time())
+
+
+def start():
+    """Start warm-up in a daemon thread (once). With WARMUP_ON_STARTUP=0 the app is ready immediately."""
+    global _thread
+    with _lock:
+        if _thread is not None or _state["status"] != "pending":
+            return
+        if not config.WARMUP_ON_STARTUP:
+            _state["status"] = "skipped"
+            return
+        _state.update(status="running", started_at=time.time())
+        _thread = threading.Thread(target=_run, name="warmup", daemon=True)
+        _thread.start()
+
+
+def _ready(status: str) -> bool:
+    return status in ("ready", "skipped") or (status == "failed" and embed_service.model_loaded())
+
+
+def is_ready() -> bool:
+    with _lock:
+        return _ready(_state["status"])
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {**_state, "ready": _ready(_state["status"])}
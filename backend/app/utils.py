@@ -3,7 +3,6 @@ import shutil
 from pathlib import Path
 
 
-import socket
 import re
 from datetime import datetime
 
@@ -24,13 +23,6 @@ def read_json(path):
         return json.load(f)
     
 
-def internet_available(host="8.8.8.8", port=53, timeout=2):
-    try:
-        socket.create_connection((host, port), timeout=timeout)
-        return True
-    except OSError:
-        return False
-
 def clean_text(t: str) -> str:
     if not t:
         return ""
@@ -19,12 +19,41 @@ def clean_text(text):
     """Removes extra whitespace and non-printable characters."""
     return re.sub(r'\s+', ' ', str(text).strip())
 
-def get_font_statistics(pdf_path):
+def extract_pages(pdf_path):
+    """
+    Single pass over a PDF: for every page, the text blocks of
+    page.get_text("dict") plus the plain text rebuilt from those same spans.
+    Shared by the outline engine and the app's section parser so ingest opens
+    and walks each PDF once. The document is closed before returning.
+    """
+    # image blocks are never used; leaving them out keeps the dicts small
+    flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    with fitz.open(pdf_path) as doc:
+        pages = []
+        for page_num, page in enumerate(doc, start=1):
+            blocks = [b for b in page.get_text("dict", flags=flags)["blocks"] if b.get("type") == 0]
+            lines = []
+            for b in blocks:
+                for line in b.get("lines", []):
+                    lines.append("".join(s.get("text", "") for s in line.get("spans", [])))
+            pages.append({
+                "number": page_num,
+                "height": page.rect.height,
+                "blocks": blocks,
+                "text": "\n".join(lines) + "\n" if lines else "",
+            })
+        return {
+            "metadata": dict(doc.metadata or {}),
+            "toc": doc.get_toc(simple=True),
+            "pages": pages,
+        }
+
+def get_font_statistics(pdf_path, extracted=None):
     """Analyze PDF fonts to find common sizes."""
-    doc = fitz.open(pdf_path)
+    extracted = extracted or extract_pages(pdf_path)
     font_sizes = Counter()
-    for page in doc:
-        blocks = page.get_text("dict")["blocks"]
+    for page in extracted["pages"]:
+        blocks = page["blocks"]
         for block in blocks:
             for line in block.get("lines", []):
                 for span in line.get("spans", []):
@@ -87,16 +116,19 @@ def is_valid_report_heading(block, profile):
 # Document Structure Extraction
 # =============================
 
-def extract_document_structure(pdf_path):
-    doc = fitz.open(pdf_path)
-    if not doc.page_count:
+def extract_document_structure(pdf_path, extracted=None):
+    """Title + outline for a PDF. Pass `extracted` (from extract_pages) to reuse a prior pass."""
+    extracted = extracted or extract_pages(pdf_path)
+    pages = extracted["pages"]
+    if not pages:
         return {"title": "", "outline": []}
 
     # --- Pass 1: Extract features ---
     all_blocks = []
     list_marker_count = 0
-    for page_num, page in enumerate(doc, start=1):
-        for b in page.get_text("dict")['blocks']:
+    for page in pages:
+        page_num = page["number"]
+        for b in page["blocks"]:
             if b['type'] == 0:
                 block = TextBlock(b, page_num)
                 if block.text:
@@ -123,7 +155,7 @@ def extract_document_structure(pdf_path):
     doc_profile = {'body_size': body_size}
 
     if doc_type == 'FORM':
-        page1_top_blocks = [b for b in all_blocks if b.page_num == 1 and b.y0 < doc[0].rect.height * 0.2]
+        page1_top_blocks = [b for b in all_blocks if b.page_num == 1 and b.y0 < pages[0]["height"] * 0.2]
         title = max(page1_top_blocks, key=lambda b: b.size).text if page1_top_blocks else all_blocks[0].text
 
     elif doc_type == 'FLYER':
@@ -161,7 +193,7 @@ def extract_document_structure(pdf_path):
     # Fallback 1: Use TOC if no outline
     # =============================
     if not outline:
-        toc = doc.get_toc(simple=True)
+        toc = extracted["toc"]
         if toc:
             outline = [{"level": f"H{lvl}", "text": clean_text(t), "page": p - 1} for lvl, t, p in toc]
 
@@ -4,24 +4,24 @@ Universal Offline PersonaExtractor (Hybrid-Balanced Version)
 - Fully offline, works for ANY PDFs and ANY persona/job
 - Dynamically extracts important keywords from persona & job
 - Uses hybrid ranking: relevance priority + balanced PDF mix
-- Writes ONLY to output/output.json
+- CLI run writes results to output/output.json; parsed chunks are cached
+  under the chunk cache dir (ROUND1B_CHUNK_CACHE_DIR) keyed by PDF content hash
 """
 
 import os
 import re
 import json
+import hashlib
+import threading
+import time
 import fitz  # PyMuPDF
 import numpy as np
 from datetime import datetime
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
 
-# Ensure NLTK data is downloaded
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
+# sentence-transformers (torch) and NLTK are imported lazily: importing this
+# module must stay cheap and must never touch the network.
 
 # =============================
 # CONFIGURATION
@@ -31,16 +31,75 @@ OUTPUT_FILE = "output/output.json"
 TOP_SECTIONS_COUNT = 5
 MIN_CHUNK_LEN = 100
 MAX_CHUNK_LEN = 2000
-
-STOPWORDS = set(stopwords.words('english'))
+ENCODE_BATCH_SIZE = 64
+# Extracted chunks are cached per PDF content hash; bump ENGINE_VERSION whenever
+# chunking or heading detection changes so stale entries are ignored.
+ENGINE_VERSION = "1b.2"
+CHUNK_CACHE_DIR = os.getenv("ROUND1B_CHUNK_CACHE_DIR", "output/chunk_cache")
+# Entries for other ENGINE_VERSIONs are pruned on write, then the least recently
+# used ones until the cache fits in CHUNK_CACHE_MAX_BYTES (deleted PDFs age out)
+CHUNK_CACHE_MAX_BYTES = int(os.getenv("ROUND1B_CHUNK_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+# NLTK data is looked up locally (bake it into the image / NLTK_DATA);
+# set ROUND1B_NLTK_DOWNLOAD=1 to fetch missing packages on first use.
+NLTK_DOWNLOAD = os.getenv("ROUND1B_NLTK_DOWNLOAD", "0") == "1"
+# Print how long the lazy NLTK and embedding model loads take (PROFILE_IMPORTS=1)
+PROFILE_IMPORTS = os.getenv("PROFILE_IMPORTS", "0") == "1"
+
+# Vendored copy of NLTK's English stopword list, used when the corpus is unavailable
+_FALLBACK_STOPWORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself
+yourselves he him his himself she she's her hers herself it it's its itself they them their
+theirs themselves what which who whom this that that'll these those am is are was were be
+been being have has had having do does did doing a an the and but if or because as until
+while of at by for with about against between into through during before after above below
+to from up down in out on off over under again further then once here there when where why
+how all any both each few more most other some such no nor not only own same so than too
+very s t can will just don don't should should've now d ll m o re ve y ain aren aren't
+couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't ma
+mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't weren
+weren't won won't wouldn wouldn't
+""".split())
+
+_nltk_state = None  # (stopwords, tokenize) once resolved
+_nltk_lock = threading.Lock()
+
+def _nltk_resources():
+    """Stopwords + tokenizer from local NLTK data, falling back to vendored equivalents."""
+    global _nltk_state
+    with _nltk_lock:
+        if _nltk_state is not None:
+            return _nltk_state
+        start = time.perf_counter()
+        stop_words, tokenize = _FALLBACK_STOPWORDS, lambda text: re.findall(r"\w+|[^\w\s]", text)
+        try:
+            import nltk
+            for resource, package in (("corpora/stopwords", "stopwords"), ("tokenizers/punkt", "punkt")):
+                try:
+                    nltk.data.find(resource)
+                except LookupError:
+                    if NLTK_DOWNLOAD:
+                        nltk.download(package, quiet=True)
+            from nltk.corpus import stopwords
+            stop_words = frozenset(stopwords.words('english'))
+            from nltk.tokenize import word_tokenize
+            word_tokenize("warm up")  # raises LookupError if punkt is missing
+            tokenize = word_tokenize
+        except Exception as e:
+            print(f"⚠️ NLTK data unavailable ({e.__class__.__name__}); using built-in stopwords/tokenizer")
+        if PROFILE_IMPORTS:
+            print(f"[INFO] load NLTK stopwords/tokenizer: {(time.perf_counter() - start) * 1000:.1f} ms")
+        _nltk_state = (stop_words, tokenize)
+        return _nltk_state
 
 # =============================
 # HELPER FUNCTIONS
 # =============================
 def extract_keywords(text: str) -> List[str]:
     """Extract meaningful keywords from persona and job text."""
-    words = word_tokenize(text.lower())
-    return list(set([w for w in words if w.isalpha() and w not in STOPWORDS]))
+    stop_words, tokenize = _nltk_resources()
+    words = tokenize(text.lower())
+    return list(set([w for w in words if w.isalpha() and w not in stop_words]))
 
 def clean_text(text: str) -> str:
     """Clean and normalize text."""
@@ -103,6 +162,10 @@ def detect_page_heading(doc, page_num: int) -> str:
     return "Untitled Section"
 
 def extract_chunks_from_pdf(pdf_path: str) -> List[Dict[str, Any]]:
+    return _extract_chunks(pdf_path)[0]
+
+def _extract_chunks(pdf_path: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """Chunks of a PDF, and whether every page was read (False after an error partway through)."""
     chunks = []
     filename = os.path.basename(pdf_path)
     try:
@@ -125,24 +188,173 @@ def extract_chunks_from_pdf(pdf_path: str) -> List[Dict[str, Any]]:
         doc.close()
     except Exception as e:
         print(f"⚠️ Error reading {pdf_path}: {e}")
+        return chunks, False
+    return chunks, True
+
+# path → ((mtime, size, inode), digest); a changed file overwrites its entry,
+# and the least recently used paths are dropped past DIGEST_MEMO_SIZE
+DIGEST_MEMO_SIZE = 4096
+_digest_memo: "OrderedDict[str, Tuple[tuple, str]]" = OrderedDict()
+_digest_lock = threading.Lock()
+
+def file_digest(pdf_path: str) -> str:
+    """SHA-256 of a file's bytes, memoized per path while (mtime, size, inode) is unchanged."""
+    st = os.stat(pdf_path)
+    path = os.path.abspath(pdf_path)
+    sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _digest_lock:
+        entry = _digest_memo.get(path)
+        if entry is not None and entry[0] == sig:
+            _digest_memo.move_to_end(path)
+            return entry[1]
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _digest_lock:
+        _digest_memo[path] = (sig, digest)
+        _digest_memo.move_to_end(path)
+        while len(_digest_memo) > DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+    return digest
+
+def get_chunks(pdf_path: str, cache_dir: str = None) -> List[Dict[str, Any]]:
+    """
+    extract_chunks_from_pdf behind a persistent cache keyed by
+    (content hash, ENGINE_VERSION); unchanged PDFs are never re-parsed.
+    Pass cache_dir=None to bypass the cache.
+    """
+    if not cache_dir:
+        return extract_chunks_from_pdf(pdf_path)
+
+    filename = os.path.basename(pdf_path)
+    try:
+        cache_path = os.path.join(cache_dir, f"{file_digest(pdf_path)}_{ENGINE_VERSION}.json")
+    except OSError as e:
+        print(f"⚠️ Error hashing {pdf_path}: {e}")
+        return extract_chunks_from_pdf(pdf_path)
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            try:
+                os.utime(cache_path)  # mark as recently used for pruning
+            except OSError:
+                pass
+            # the same bytes may live under another name: re-stamp the document
+            return [dict(c, document=filename) for c in cached]
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable chunk cache {cache_path}: {e}")
+
+    chunks, complete = _extract_chunks(pdf_path)
+    # a partial extraction would be served forever under this hash; only cache complete ones
+    if chunks and complete:
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(chunks, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️ Not caching chunks in {cache_dir}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        else:
+            prune_chunk_cache(cache_dir, keep=cache_path)
     return chunks
 
+def prune_chunk_cache(cache_dir: str, keep: str = None, max_bytes: int = None) -> int:
+    """
+    Delete cache entries written by other ENGINE_VERSIONs, then the least recently
+    used ones until the rest fit in max_bytes (CHUNK_CACHE_MAX_BYTES by default).
+    `keep` is never deleted. Returns the number of files removed.
+    """
+    if max_bytes is None:
+        max_bytes = CHUNK_CACHE_MAX_BYTES
+    suffix = f"_{ENGINE_VERSION}.json"
+    entries, stale = [], []
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(cache_dir, name)
+        if not name.endswith(suffix):
+            stale.append(path)
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()  # oldest first
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path != keep:
+            stale.append(path)
+            total -= size
+
+    removed = 0
+    for path in stale:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
 # =============================
 # RANKING
 # =============================
-def rank_chunks(chunks: List[Dict[str, Any]], persona: str, job: str, model) -> List[Dict[str, Any]]:
+def keyword_matcher(keywords: List[str]):
+    """
+    Build a function returning how many distinct `keywords` occur (as substrings)
+    in a lowercase text, using one precompiled regex instead of a scan per keyword.
+    """
+    if not keywords:
+        return lambda text: 0
+    # longest first, so at each position the lookahead captures the longest keyword;
+    # shorter keywords that are prefixes of it are recovered via `contained`
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in ordered) + "))")
+    contained = {k: {k2 for k2 in ordered if k2 in k} for k in ordered}
+
+    def count(text: str) -> int:
+        found = set()
+        for m in pattern.finditer(text):
+            kw = m.group(1)
+            if kw not in found:
+                found |= contained[kw]
+        return len(found)
+    return count
+
+def rank_chunks(chunks: List[Dict[str, Any]], persona: str, job: str, model, batch_size: int = ENCODE_BATCH_SIZE) -> List[Dict[str, Any]]:
     """Rank chunks based on semantic similarity + keyword match."""
+    if not chunks:
+        return []
     reference_text = f"Persona: {persona}. Task: {job}"
-    reference_embedding = model.encode(reference_text, convert_to_tensor=False)
-    boost_keywords = extract_keywords(persona + " " + job)
+    reference_embedding = np.asarray(model.encode(reference_text, convert_to_tensor=False), dtype=np.float32)
+    count_keywords = keyword_matcher(extract_keywords(persona + " " + job))
+
+    # All chunks in batched forward passes, then one mat-vec for the cosine scores
+    embs = np.asarray(model.encode([c["content"] for c in chunks], batch_size=batch_size,
+                                   convert_to_tensor=False, show_progress_bar=False), dtype=np.float32)
+    norms = np.linalg.norm(embs, axis=1) * np.linalg.norm(reference_embedding)
+    sims = np.divide(embs @ reference_embedding, norms, out=np.zeros(len(chunks), dtype=np.float32), where=norms > 0)
 
     ranked = []
-    for chunk in chunks:
-        emb = model.encode(chunk["content"], convert_to_tensor=False)
-        sim_score = float(np.dot(reference_embedding, emb) /
-                          (np.linalg.norm(reference_embedding) * np.linalg.norm(emb)))
-        keyword_boost = sum(1 for kw in boost_keywords if kw in chunk["content"].lower())
-        final_score = sim_score + (0.02 * keyword_boost)
+    for chunk, sim_score in zip(chunks, sims):
+        keyword_boost = count_keywords(chunk["content"].lower())
+        final_score = float(sim_score) + (0.02 * keyword_boost)
         chunk["relevance_score"] = final_score
         ranked.append(chunk)
 
@@ -191,22 +403,45 @@ def refine_chunk_text(content: str) -> str:
 # =============================
 # MAIN PIPELINE
 # =============================
-def process_pdfs(persona: str, job: str) -> None:
-    print("\n🔍 Loading local embedding model...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+_model = None
+_model_lock = threading.Lock()
+
+def get_default_model():
+    """Process-wide SentenceTransformer for callers that don't pass their own."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            print("\n🔍 Loading local embedding model...")
+            start = time.perf_counter()
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer('all-MiniLM-L6-v2')
+            if PROFILE_IMPORTS:
+                print(f"[INFO] load embedding model all-MiniLM-L6-v2: {(time.perf_counter() - start) * 1000:.1f} ms")
+        return _model
+
+def run_pipeline(persona: str, job: str, input_dirs: List[str], model=None,
+                 top_n: int = TOP_SECTIONS_COUNT, cache_dir: str = CHUNK_CACHE_DIR) -> Dict[str, Any]:
+    """
+    Re-entrant core of the extractor: reads PDFs from `input_dirs` and returns
+    the result dict in memory. Touches no module globals and only writes the
+    chunk cache (atomically), so concurrent calls (threads or workers) are safe.
+    """
+    model = model or get_default_model()
 
-    pdf_files = [os.path.join(INPUT_DIR, f) for f in os.listdir(INPUT_DIR) if f.lower().endswith(".pdf")]
-    print(f"📄 Found {len(pdf_files)} PDFs in {INPUT_DIR}")
+    pdf_files = []
+    for input_dir in input_dirs:
+        pdf_files.extend(os.path.join(input_dir, f) for f in sorted(os.listdir(input_dir)) if f.lower().endswith(".pdf"))
+    print(f"📄 Found {len(pdf_files)} PDFs in {', '.join(input_dirs)}")
 
     all_chunks = []
     for pdf in pdf_files:
-        all_chunks.extend(extract_chunks_from_pdf(pdf))
+        all_chunks.extend(get_chunks(pdf, cache_dir))
 
     if not all_chunks:
         raise ValueError("❌ No content extracted from PDFs.")
 
     ranked_chunks = rank_chunks(all_chunks, persona, job, model)
-    top_chunks = select_hybrid_top_chunks(ranked_chunks, TOP_SECTIONS_COUNT)
+    top_chunks = select_hybrid_top_chunks(ranked_chunks, top_n)
 
     extracted_sections = []
     subsection_analysis = []
@@ -224,7 +459,7 @@ def process_pdfs(persona: str, job: str) -> None:
             "page_number": ch["page_number"]
         })
 
-    result = {
+    return {
         "metadata": {
             "input_documents": [os.path.basename(p) for p in pdf_files],
             "persona": persona,
@@ -235,11 +470,16 @@ def process_pdfs(persona: str, job: str) -> None:
         "subsection_analysis": subsection_analysis
     }
 
+def process_pdfs(persona: str, job: str) -> Dict[str, Any]:
+    """CLI wrapper: run_pipeline over INPUT_DIR, written to OUTPUT_FILE."""
+    result = run_pipeline(persona, job, [INPUT_DIR])
+
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(result, f, indent=2, ensure_ascii=False)
 
     print(f"✅ Extraction complete. Output written to {OUTPUT_FILE}")
+    return result
 
 # =============================
 # ENTRY POINT
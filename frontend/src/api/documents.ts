@@ -1,5 +1,5 @@
 import { api } from "./client";
-import type { DocMeta } from "./types";
+import type { DocMeta, IngestJob } from "./types";
 
 /**
  * Fetches the list of all available documents from the backend.
@@ -9,8 +9,18 @@ export async function listDocuments(): Promise<DocMeta[]> {
   return data?.documents ?? [];
 }
 
+/**
+ * Fetches the status of a background ingest job.
+ */
+export async function getIngestJob(jobId: string): Promise<IngestJob> {
+  const { data } = await api.get(`/ingest/jobs/${encodeURIComponent(jobId)}`);
+  return data;
+}
+
 /**
  * Uploads one or more documents to the backend in a single request.
+ * The backend acknowledges with a job id; this polls the job until all files
+ * are parsed and embedded, so callers can refresh the document list afterwards.
  * @param files - An array of File objects to upload.
  * @param historical - A boolean flag indicating if the documents are historical.
  */
@@ -31,7 +41,12 @@ export async function ingestDocuments(files: File[], historical = false) {
         "Content-Type": "multipart/form-data",
       },
     });
-    return response;
+    let job: IngestJob = response.data;
+    while (job.status === "queued" || job.status === "running") {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      job = await getIngestJob(job.id);
+    }
+    return job;
   } catch (error) {
     console.error("CRITICAL ERROR in ingestDocuments API call:", error);
     throw error;
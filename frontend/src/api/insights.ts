@@ -1,5 +1,6 @@
 import { api } from "./client";
-import type { HybridResponse, InsightsResponse } from "./types";
+import { BACKEND_URL } from "../config";
+import type { DocChatResult, HybridResponse, InsightsResponse } from "./types";
 
 /**
  * Fetches both snippets and insights from the backend in a single call to /recommend.
@@ -56,11 +57,56 @@ export async function chat(message: string, context: string[]) {
  * Sends a message to the document chat endpoint.
  * Used in the AI Chat tab.
  */
-export async function docChat(message: string) {
+export async function docChat(message: string): Promise<DocChatResult> {
   const payload = {
     message,
     top_k: 5, // configurable later
   };
-  const { data } = await api.post("/doc-chat", payload);
+  const { data } = await api.post<DocChatResult>("/doc-chat", payload);
   return data; // e.g. { response: "...", context_used: [...] }
 }
+
+export type DocChatStreamHandlers = {
+  onContext?: (contextUsed: string[]) => void;
+  onToken: (text: string) => void;
+};
+
+/**
+ * Streaming variant of docChat: reads server-sent events from /doc-chat/stream,
+ * calling onToken as the answer arrives. Resolves with the final "done" or
+ * "error" payload (same fields as the /doc-chat response).
+ */
+export async function docChatStream(message: string, handlers: DocChatStreamHandlers): Promise<DocChatResult> {
+  const res = await fetch(`${BACKEND_URL}/doc-chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ message, top_k: 5 }),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`doc-chat stream failed with status ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result: DocChatResult = { mode: "error", response: "Stream ended unexpectedly" };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? "{}");
+      if (event === "context") handlers.onContext?.(data.context_used ?? []);
+      else if (event === "token") handlers.onToken(data.text ?? "");
+      else if (event === "done" || event === "error") result = { ...data, event };
+    }
+  }
+  return result;
+}
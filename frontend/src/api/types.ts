@@ -69,3 +69,25 @@ export type PodcastResponse = {
   script: string;
   tts?: { url?: string; audio_path?: string };
 };
+
+// --- Blueprint for a background /ingest job (GET /ingest/jobs/{id}) ---
+export type IngestJob = {
+  id: string;
+  kind: string;
+  status: "queued" | "running" | "done" | "error" | "failed";
+  created_at: string;
+  finished_at: string | null;
+  files: { filename: string; status: string; message?: string }[];
+  progress: { done: number; total: number };
+  error?: string;  // set when the job as a whole failed ("failed")
+};
+
+// --- Blueprint for a /doc-chat answer (or the final /doc-chat/stream event) ---
+export type DocChatResult = {
+  mode: string;              // "online", "online_error", "offline_breaker_open", "error", ...
+  response?: string;         // full answer; on the stream only set when no tokens were sent
+  error?: string;
+  context_used?: string[];
+  query?: string;
+  event?: "done" | "error";  // which SSE event ended the stream
+};
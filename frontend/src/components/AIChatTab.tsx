@@ -1,10 +1,11 @@
-import { useState } from "react";
-import { docChat } from "../api/insights"; // <-- Import our new function
+import { useRef, useState } from "react";
+import { docChatStream } from "../api/insights";
 import { SendIcon } from "./Icons";
 import { EmptyState } from "./EmptyState";
 
 // Define a type for our message objects for better type safety
 type Message = { 
+  id?: number; // set on streamed messages so tokens land in the right one
   role: "user" | "assistant"; 
   text: string;
 };
@@ -13,6 +14,9 @@ export default function AIChatTab() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false); // <-- Add a loading state
+  // True once the answer has started streaming (hides "Thinking...", input stays locked)
+  const [isStreaming, setIsStreaming] = useState(false);
+  const nextId = useRef(0);
 
   // --- THIS IS THE IMPLEMENTED 'send' FUNCTION ---
   async function send() {
@@ -24,18 +28,36 @@ export default function AIChatTab() {
     setInput("");
     setIsLoading(true);
 
+    // Update the text of this request's assistant message, wherever it is in the list
+    const assistantId = nextId.current++;
+    const setAssistantText = (update: (text: string) => string) =>
+      setMessages(prev => prev.map(m => (m.id === assistantId ? { ...m, text: update(m.text) } : m)));
+
     try {
-      // Call the backend API
-      const response = await docChat(userMessage);
-      
-      // Create the assistant's response message object
-      const assistantMessage: Message = {
-        role: "assistant",
-        text: response.response || "Sorry, I encountered an error."
-      };
+      // Stream the answer into a new assistant message as tokens arrive.
+      // isLoading stays true until the stream ends, so no second send can interleave.
+      let started = false;
+      const result = await docChatStream(userMessage, {
+        onToken: (token) => {
+          if (!started) {
+            started = true;
+            setIsStreaming(true);
+            setMessages(prev => [...prev, { id: assistantId, role: "assistant", text: token }]);
+          } else {
+            setAssistantText(text => text + token);
+          }
+        },
+      });
 
-      // Add the assistant's message to the chat history
-      setMessages(prev => [...prev, assistantMessage]);
+      if (!started) {
+        // No tokens: out of context or an error
+        setMessages(prev => [...prev, {
+          role: "assistant",
+          text: result.response || "Sorry, I encountered an error."
+        }]);
+      } else if (result.event === "error") {
+        setAssistantText(text => `${text}\n\n(${result.response})`);
+      }
 
     } catch (error) {
       console.error("AI Chat failed:", error);
@@ -48,6 +70,7 @@ export default function AIChatTab() {
     } finally {
       // Always stop the loading state
       setIsLoading(false);
+      setIsStreaming(false);
     }
   }
 
@@ -67,7 +90,7 @@ export default function AIChatTab() {
         ))}
         
         {/* Show a "Thinking..." bubble while waiting for the backend */}
-        {isLoading && (
+        {isLoading && !isStreaming && (
           <div className="flex justify-start">
             <div className="max-w-xs md:max-w-md p-3 rounded-2xl text-sm bg-surface-inset text-content-subtle rounded-bl-lg animate-pulse">
               Thinking...